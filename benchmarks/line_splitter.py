@@ -0,0 +1,91 @@
+"""
+Compare splitting a decompressed v2 inventory into lines against re-slicing a buffer after every line.
+
+Run from the repository root with the path to an intersphinx inventory, ideally one with 50k+ lines:
+    python -m benchmarks.line_splitter path/to/objects.inv
+"""
+import argparse
+import asyncio
+import time
+import zlib
+from typing import AsyncIterator, Callable, Iterator, List
+
+from docs.inventory_parser import ZlibStreamReader, _decompress_line_blocks
+
+# Number of lines before the zlib data of a v2 inventory.
+HEADER_LINES = 4
+
+
+class _BytesStream:
+    """Serve `data` through `iter_chunked` like an `aiohttp.StreamReader` of a response."""
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+
+    async def iter_chunked(self, size: int) -> AsyncIterator[bytes]:
+        for start in range(0, len(self.data), size):
+            yield self.data[start:start + size]
+
+
+def _buffer_lines(data: bytes) -> Iterator[str]:
+    """Split the zlib `data` into lines by re-slicing what's left of a buffer after each line, the old approach."""
+    decompressor = zlib.decompressobj()
+    buf = b''
+    for start in range(0, len(data), ZlibStreamReader.READ_CHUNK_SIZE):
+        buf += decompressor.decompress(data[start:start + ZlibStreamReader.READ_CHUNK_SIZE])
+        pos = buf.find(b'\n')
+        while pos != -1:
+            yield buf[:pos].decode()
+            buf = buf[pos + 1:]
+            pos = buf.find(b'\n')
+    buf += decompressor.flush()
+    if buf:
+        yield buf.decode()
+
+
+def _stream_lines(data: bytes) -> List[str]:
+    """Split the zlib `data` into lines with `ZlibStreamReader`, streamed in `READ_CHUNK_SIZE` chunks."""
+    async def read() -> List[str]:
+        return [line async for line in ZlibStreamReader(_BytesStream(data))]
+    return asyncio.run(read())
+
+
+def _block_lines(data: bytes) -> List[str]:
+    """Split the zlib `data` into lines with `_decompress_line_blocks`, used for local inventories."""
+    return [line.decode() for block in _decompress_line_blocks(memoryview(data)) for line in block.split(b'\n')]
+
+
+def _time(function: Callable[[], List[str]], repeat: int) -> float:
+    """Return the best time of `repeat` calls to `function`, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("inventory", help="Path to a v2 objects.inv file")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per splitter, the best is reported")
+    args = parser.parse_args()
+
+    with open(args.inventory, "rb") as file:
+        for _ in range(HEADER_LINES):
+            file.readline()
+        data = file.read()
+
+    expected = list(_buffer_lines(data))
+    print(f"{len(expected)} lines, {len(data) / 1024:.0f} kB compressed")
+    print(f"{'splitter':<24}{'time':>12}  same")
+    for name, function in (
+        ("buffer re-slicing", lambda: list(_buffer_lines(data))),
+        ("ZlibStreamReader", lambda: _stream_lines(data)),
+        ("_decompress_line_blocks", lambda: _block_lines(data)),
+    ):
+        print(f"{name:<24}{_time(function, args.repeat):>10.2f}ms  {function() == expected}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Compare the lookups of `docs.search.SearchIndex` against scanning every name with `docs.utils.finder`.
+
+Run from the repository root with the path to an intersphinx inventory:
+    python -m benchmarks.search_index path/to/objects.inv [query ...]
+"""
+import argparse
+import time
+from typing import Callable, List
+
+from docs.inventory_parser import parse_inventory
+from docs.search import SearchIndex
+from docs.utils import finder
+
+DEFAULT_QUERIES = (
+    "json.dumps", "get", "os", "a", "ClientSession", "dsnk.Embed", "xyzq", "asyncio.gather", "Member.display",
+)
+
+
+def _time(function: Callable[[], List[str]], repeat: int) -> float:
+    """Return the best time of `repeat` calls to `function`, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("inventory", help="Path to an objects.inv file")
+    parser.add_argument("queries", nargs="*", default=DEFAULT_QUERIES, help="Queries to look up")
+    parser.add_argument("--limit", type=int, default=4, help="Number of results per query, like `Docs.limit`")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs per query, the best is reported")
+    args = parser.parse_args()
+
+    with open(args.inventory, "rb") as file:
+        names = list(dict.fromkeys(name for _, name, _ in parse_inventory(args.inventory, file.read())))
+
+    start = time.perf_counter()
+    index = SearchIndex({"package": names})
+    print(f"{len(names)} names, index built in {time.perf_counter() - start:.2f}s")
+
+    finder_total = index_total = 0.0
+    mismatches = 0
+    print(f"{'query':<20}{'finder':>12}{'index':>12}  same")
+    for query in args.queries:
+        expected = finder(query, names, lazy=False, k=args.limit)
+        same = index.search(query, args.limit) == expected
+        mismatches += not same
+        finder_time = _time(lambda: finder(query, names, lazy=False, k=args.limit), args.repeat)
+        index_time = _time(lambda: index.search(query, args.limit), args.repeat)
+        finder_total += finder_time
+        index_total += index_time
+        print(f"{query:<20}{finder_time:>10.2f}ms{index_time:>10.2f}ms  {same}")
+    print(f"{'total':<20}{finder_total:>10.2f}ms{index_total:>10.2f}ms  {mismatches} mismatches")
+
+
+if __name__ == "__main__":
+    main()
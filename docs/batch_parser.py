@@ -2,10 +2,12 @@ from __future__ import annotations
 
 import asyncio
 import collections
+import os
 from collections import defaultdict
 from contextlib import suppress
 from operator import attrgetter
-from typing import Deque, Dict, List, NamedTuple, Optional, Union
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional, Union
+from urllib.parse import unquote
 
 from bs4 import BeautifulSoup
 import aiohttp
@@ -39,23 +41,31 @@ class ParseResultFuture(asyncio.Future):
         self.user_requested = False
 
 
+def _read_page(path: str) -> str:
+    """Read the HTML page at `path`."""
+    with open(path, encoding="utf8") as file:
+        return file.read()
+
+
 class BatchParser:
     """
-    DocItems are added through the `add_item` method which adds them to the `_page_doc_items` dict.
+    `page_items` is called with a DocItem to get the DocItems of all symbols on its page.
     `get_markdown` is used to fetch the Markdown; when this is used for the first time on a page,
     all of the symbols are queued to be parsed to avoid multiple web requests to the same page.
+    Pages of documentation whose base url is mapped to a local build directory in `local_roots` are read from disk instead.
     """
 
-    def __init__(self):
+    def __init__(self, page_items: Callable[[cog.DocItem], List[cog.DocItem]]):
         self._queue: Deque[QueueItem] = collections.deque()
-        self._page_doc_items: Dict[str, List[cog.DocItem]] = defaultdict(list)
+        self._page_items = page_items
         self._item_futures: Dict[cog.DocItem, ParseResultFuture] = defaultdict(ParseResultFuture)
         self._parse_task = None
         self._loop = asyncio.get_event_loop()
+        self.local_roots: Dict[str, str] = {}  # Maps base urls to the local build directories serving their pages.
 
-    async def get_markdown(self, doc_item: cog.DocItem) -> Optional[str]:
+    async def get_markdown(self, doc_item: cog.DocItem, session: aiohttp.ClientSession) -> Optional[str]:
         """
-        Get the result Markdown of `doc_item`.
+        Get the result Markdown of `doc_item`, fetching its page through `session`.
         If no symbols were fetched from `doc_item`s page before,
         the HTML has to be fetched and then all items from the page are put into the parse queue.
         Not safe to run while `self.clear` is running.
@@ -63,16 +73,14 @@ class BatchParser:
         if doc_item not in self._item_futures and doc_item not in self._queue:
             self._item_futures[doc_item].user_requested = True
 
-            async with aiohttp.ClientSession() as session:
-                async with session.get(doc_item.url) as response:
-                    soup = await self._loop.run_in_executor(
-                        None,
-                        BeautifulSoup,
-                        await response.text(encoding="utf8"),
-                        'html.parser'
-                    )
+            soup = await self._loop.run_in_executor(
+                None,
+                BeautifulSoup,
+                await self._fetch_page(doc_item, session),
+                'html.parser'
+            )
 
-            self._queue.extendleft(QueueItem(item, soup) for item in self._page_doc_items[doc_item.url])
+            self._queue.extendleft(QueueItem(item, soup) for item in self._page_items(doc_item))
 
             if self._parse_task is None:
                 self._parse_task = create_task(self._parse_queue(), name="Queue parse")
@@ -83,6 +91,15 @@ class BatchParser:
             self._move_to_front(doc_item)
         return await self._item_futures[doc_item]
 
+    async def _fetch_page(self, doc_item: cog.DocItem, session: aiohttp.ClientSession) -> str:
+        """Return the HTML of the page `doc_item` is on, read from disk for local documentation."""
+        if (root := self.local_roots.get(doc_item.base_url)) is not None:
+            path = os.path.join(root, unquote(doc_item.relative_url_path))
+            return await self._loop.run_in_executor(None, _read_page, path)
+
+        async with session.get(doc_item.url) as response:
+            return await response.text(encoding="utf8")
+
     async def _parse_queue(self) -> None:
         """
         The coroutine will run as long as the queue is not empty, resetting `self._parse_task` to None when finished.
@@ -99,11 +116,14 @@ class BatchParser:
 
                 try:
                     markdown = await self._loop.run_in_executor(None, get_symbol_markdown, soup, item)
-                    if markdown is not None:
-                        doc_cache.set(item, markdown)
                 except Exception:
                     pass
 
+                if future.done():
+                    # The symbol's package was removed while it was being parsed, see `remove_package`.
+                    continue
+                if markdown is not None:
+                    doc_cache.set(item, markdown)
                 future.set_result(markdown)
                 del self._item_futures[item]
                 await asyncio.sleep(0.1)
@@ -120,9 +140,17 @@ class BatchParser:
 
         self._queue.append(queue_item)
 
-    def add_item(self, doc_item: cog.DocItem) -> None:
-        """Map a DocItem to its page so that the symbol will be parsed once the page is requested."""
-        self._page_doc_items[doc_item.url].append(doc_item)
+    def remove_package(self, package_name: str) -> None:
+        """
+        Unqueue the symbols of `package_name` and drop their futures.
+        Futures that are still pending are resolved with None, so nothing waits on them forever.
+        """
+        self._queue = collections.deque(
+            queue_item for queue_item in self._queue if queue_item.doc_item.package != package_name
+        )
+        for doc_item in [doc_item for doc_item in self._item_futures if doc_item.package == package_name]:
+            if not (future := self._item_futures.pop(doc_item)).done():
+                future.set_result(None)
 
     async def clear(self) -> None:
         """
@@ -134,5 +162,4 @@ class BatchParser:
         if self._parse_task is not None:
             self._parse_task.cancel()
         self._queue.clear()
-        self._page_doc_items.clear()
         self._item_futures.clear()
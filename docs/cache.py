@@ -1,6 +1,7 @@
 from __future__ import annotations
 
-from typing import Optional, Union, Dict, TYPE_CHECKING
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple, Union, TYPE_CHECKING
 if TYPE_CHECKING:
     from .cog import DocItem
 
@@ -28,6 +29,12 @@ class DocCache:
             return result
         return None
 
+    def remove(self, item: DocItem) -> None:
+        """Remove the Markdown content of the symbol `item` if it exists."""
+        key = self.cache.get(item.package)
+        if key is not None:
+            key.pop(item.symbol_id, None)
+
     def delete(self, package: str = None) -> bool:
         """Remove all values for `package`; return True if at least one key was deleted, False otherwise."""
 
@@ -38,3 +45,51 @@ class DocCache:
             except KeyError:
                 return False
         self.cache = {}
+
+
+class CachedQuery(NamedTuple):
+    """The resolved symbols of a query, and the payloads of the embeds built from them if they could all be parsed."""
+
+    symbols: List[Tuple[str, DocItem]]
+    embeds: Optional[List[Dict[str, Any]]]
+
+
+class QueryCache:
+    """
+    A least recently used cache of resolved queries.
+    Keys should include the generation of the symbol registry the query was resolved against,
+    so results from a replaced registry are never served.
+    """
+
+    def __init__(self, maxsize: int = 512) -> None:
+        self.maxsize = maxsize
+        self.cache: OrderedDict[Hashable, CachedQuery] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        """The share of lookups that were served from the cache, 0 if there were none."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: Hashable) -> Optional[CachedQuery]:
+        """Return the query stored under `key` and mark it as recently used, None if it isn't stored."""
+        query = self.cache.get(key)
+        if query is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.cache.move_to_end(key)
+        return query
+
+    def set(self, key: Hashable, query: CachedQuery) -> None:
+        """Store `query` under `key`, dropping the least recently used query if the cache is full."""
+        self.cache[key] = query
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all queries, the hit and miss counts are kept."""
+        self.cache.clear()
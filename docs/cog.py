@@ -1,10 +1,18 @@
 from __future__ import annotations
 
+import os
 import sys
+import time
 import asyncio
+import logging
 import string as st
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from itertools import islice
 from types import SimpleNamespace
-from typing import Dict, NamedTuple, Optional, List, Union
+from typing import AsyncIterator, Dict, Iterable, NamedTuple, Optional, List, Tuple, TypeVar, Union
 
 import aiohttp
 import disnake
@@ -12,13 +20,27 @@ from disnake import Client, AppCmdInter
 from disnake.ext import commands
 from disnake.ext.commands import Bot, Param
 
+from .cache import CachedQuery, QueryCache
 from .converters import Inventory, PackageName
-from .lock import SharedEvent
+from .helpers import is_http_url, local_path
 from .messages import send_denial
-from .pagination import EmbedPaginator
-from . import PRIORITY_PACKAGES, batch_parser, doc_cache
-from .inventory_parser import InventoryDict, fetch_inventory
+from .pagination import EmbedPage, EmbedPaginator
+from . import PRIORITY_PACKAGES, batch_parser, doc_cache, snapshot
+from .registry import DocItem, SymbolRegistry
+from .search import HAS_NUMPY, AutocompleteCache, AutocompleteIndex, SearchIndex, TypoIndex, VectorScorer, match_span
+from .inventory_parser import (
+    ENTRY_BATCH_SIZE,
+    NOT_MODIFIED,
+    InvalidInventoryError,
+    InventoryConsumer,
+    InventoryDict,
+    InventoryEntry,
+    inventory_validators,
+    stream_inventory
+)
 from .utils import (
+    backoff_delay,
+    clean_symbol_name,
     create_task,
     Scheduler,
     finder,
@@ -35,30 +57,198 @@ FORCE_PREFIX_GROUPS = (
     "2to3fixer",
 )
 NOT_FOUND_DELETE_DELAY = 30.0
-# Delay to wait before trying to reach a rescheduled inventory again, in minutes
-FETCH_RESCHEDULE_DELAY = SimpleNamespace(first=2, repeated=5)
+# Delay to wait before trying to reach a rescheduled inventory again in minutes, see `utils.backoff_delay`
+FETCH_RESCHEDULE_DELAY = SimpleNamespace(base=2, factor=2, maximum=30, jitter=0.25)
 
 COMMAND_LOCK_SINGLETON = "inventory refresh"
 
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class RefreshTiming(NamedTuple):
+    """How long the last refresh of a package's inventory took, in seconds."""
+
+    fetch: float  # Downloading and parsing the inventory, without the time spent applying its entries
+    update: float  # Matching the parsed entries to the symbols while downloading, and applying them afterwards
+
+
+class PackageUpdate(InventoryConsumer):
+    """
+    Applies the entries of a package's inventory to the cog once the whole inventory was parsed.
+    While the inventory is parsed, its entries are matched against the package's current symbols,
+    and only the difference is held: the new locations of moved symbols and the symbols that are new.
+    Nothing is applied until `finish`, so an inventory that can't be read whole leaves the registry untouched.
+    `finish` then replaces the moved symbols along with their cached Markdown and removes the missing ones
+    before adding the new symbols, as adding a symbol may rename existing ones.
+    The changes are applied in batches of `ENTRY_BATCH_SIZE`, with other tasks running in between, while
+    `cog.package_update_lock` keeps the other updates from renaming symbols until all of them were applied.
+    Only the first entry of a symbol is used if the inventory contains duplicates.
+    The entries are applied to `registry` and the package's base url is set in `base_urls`,
+    which are either the cog's or copies that replace them once the refresh is done.
+    """
+
+    def __init__(self, cog: Docs, registry: SymbolRegistry, base_urls: Dict[str, str], package_name: str, base_url: str):
+        self.cog = cog
+        self.registry = registry
+        self.base_urls = base_urls
+        self.package_name = package_name
+        self.base_url = base_url
+        self.update_time = 0.0  # Time spent applying entries, in seconds.
+        self._batch_start = 0.0
+
+        self._group_names: Dict[str, str] = {}
+        self._seen: Dict[str, set] = defaultdict(set)
+        self._new_locations: Dict[Tuple[str, str], str] = {}
+        # (symbol_name, group_name, inventory_name, location) of the symbols whose location changed.
+        self._moved: List[Tuple[str, str, str, str]] = []
+        self._current = registry.package_groups(package_name)
+        self._rename_count = registry.rename_count
+        self._fresh = not self._current
+
+    def _sync_current(self) -> None:
+        """Recollect the current symbols if any were renamed by other updates since they were collected."""
+        registry = self.registry
+        if self._fresh or registry.rename_count == self._rename_count:
+            return
+        self._current = registry.package_groups(self.package_name)
+        for group_name, symbols in self._current.items():
+            for inventory_name in self._seen.get(group_name, ()):
+                symbols.pop(inventory_name, None)
+        self._rename_count = registry.rename_count
+
+    def add_entries(self, entries: List[InventoryEntry]) -> None:
+        """Hold back the moved and new symbols among `entries`."""
+        start = time.perf_counter()
+        self._sync_current()
+        group_names = self._group_names
+        for type_, inventory_name, location in entries:
+            if (group_name := group_names.get(type_)) is None:
+                # e.g. get 'class' from 'py:class'
+                group_name = group_names[type_] = sys.intern(type_.split(":")[1])
 
-class DocItem(NamedTuple):
-    """Holds inventory symbol information."""
+            seen = self._seen[group_name]
+            if inventory_name in seen:
+                continue
+            seen.add(inventory_name)
 
-    package: str  # Name of the package name the symbol is from
-    group: str  # Interpshinx "role" of the symbol, for example `label` or `method`
-    base_url: str  # Absolute path to to which the relative path resolves, same for all items with the same package
-    relative_url_path: str  # Relative path to the page where the symbol is located
-    symbol_id: str  # Fragment id used to locate the symbol on the page
+            symbols = self._current.get(group_name)
+            if symbols and (symbol_name := symbols.pop(inventory_name, None)) is not None:
+                if self._moved_location(symbol_name, location):
+                    self._moved.append((symbol_name, group_name, inventory_name, location))
+            else:
+                self._new_locations[group_name, inventory_name] = location
+        self.update_time += time.perf_counter() - start
+
+    async def _batched(self, items: Iterable[T]) -> AsyncIterator[T]:
+        """Yield `items`, letting other tasks run after every `ENTRY_BATCH_SIZE` of them."""
+        for index, item in enumerate(items, start=1):
+            yield item
+            if index % ENTRY_BATCH_SIZE == 0:
+                self.update_time += time.perf_counter() - self._batch_start
+                await asyncio.sleep(0)
+                self._batch_start = time.perf_counter()
+
+    async def finish(self) -> None:
+        """Replace the moved symbols, remove the ones missing from the inventory and add the new ones."""
+        async with self.cog.package_update_lock:
+            self._batch_start = time.perf_counter()
+            await self._apply()
+            self.update_time += time.perf_counter() - self._batch_start
+
+    async def _apply(self) -> None:
+        """Apply the held back changes to the registry, see `finish`."""
+        if self._moved and self.registry.rename_count != self._rename_count:
+            # Other updates renamed symbols since the moved ones were matched, so their names are looked up again.
+            groups = self.registry.package_groups(self.package_name)
+            self._moved = [
+                (groups[group_name][inventory_name], group_name, inventory_name, location)
+                for _, group_name, inventory_name, location in self._moved
+            ]
+        self._sync_current()
+        async for symbol_name, group_name, inventory_name, location in self._batched(self._moved):
+            self._update_symbol(symbol_name, group_name, inventory_name, location)
+
+        removed = [(inventory_name, symbol_name) for symbols in self._current.values() for inventory_name, symbol_name in symbols.items()]
+        async for _, symbol_name in self._batched(removed):
+            self.registry.remove(symbol_name)
+        async for inventory_name in self._batched({inventory_name for inventory_name, _ in removed}):
+            self._resolve_renamed(inventory_name)
+
+        async for (group_name, inventory_name), location in self._batched(self._new_locations.items()):
+            self._add_symbol(group_name, inventory_name, location)
+
+        self.base_urls[self.package_name] = self.base_url
+        if self.package_name not in self.cog.ALL_PACKAGES:
+            self.cog.ALL_PACKAGES.append(self.package_name)
+
+    def _resolve_renamed(self, inventory_name: str) -> None:
+        """
+        Name the symbols named `inventory_name` in their inventory again if any of them was renamed,
+        like they would be named if the removed symbols were never added.
+        """
+        registry = self.registry
+        renamed = [
+            symbol_name for symbol_name in registry.segment_symbols(inventory_name.rpartition(".")[2])
+            if registry.inventory_name(symbol_name) == inventory_name
+        ]
+        if renamed == [inventory_name] or not renamed:
+            return
+
+        # Packages were added with the priority ones first, and the symbols of a package in the order of its inventory.
+        package_positions = {package: position for position, package in enumerate(registry.packages())}
+        renamed.sort(key=lambda symbol_name: (
+            registry.symbol_package(symbol_name) not in PRIORITY_PACKAGES,
+            package_positions[registry.symbol_package(symbol_name)],
+            registry.symbol_row(symbol_name),
+        ))
+        # The symbols are moved out of the way under names no symbol can have, renaming keeps their rows.
+        temporary_names = [f"{inventory_name}\0{index}" for index in range(len(renamed))]
+        for symbol_name, temporary_name in zip(renamed, temporary_names):
+            registry.rename(symbol_name, temporary_name)
+        for temporary_name in temporary_names:
+            doc_item = registry[temporary_name]
+            registry.rename(
+                temporary_name,
+                self.cog.ensure_unique_symbol_name(registry, doc_item.package, doc_item.group, inventory_name),
+            )
 
-    @property
-    def url(self) -> str:
-        """Return the absolute url to the symbol."""
-        return self.base_url + self.relative_url_path
+    def _moved_location(self, symbol_name: str, location: str) -> bool:
+        """Return True if the symbol stored under `symbol_name` isn't at `location` of the package's base url."""
+        relative_url_path, _, symbol_id = location.partition("#")
+        doc_item = self.registry[symbol_name]
+        return (
+            doc_item.relative_url_path != relative_url_path or
+            doc_item.symbol_id != symbol_id or
+            doc_item.base_url != self.base_url
+        )
+
+    def _update_symbol(self, symbol_name: str, group_name: str, inventory_name: str, location: str) -> None:
+        """Replace the symbol stored under `symbol_name` with one at `location`."""
+        relative_url_path, _, symbol_id = location.partition("#")
+        doc_cache.remove(self.registry.remove(symbol_name))
+        doc_item = DocItem(self.package_name, group_name, self.base_url, sys.intern(relative_url_path), symbol_id)
+        self.registry.add(symbol_name, doc_item, inventory_name)
+
+    def _add_symbol(self, group_name: str, inventory_name: str, location: str) -> None:
+        """Add a new symbol, renaming it or the symbol it conflicts with if needed."""
+        symbol_name = self.cog.ensure_unique_symbol_name(self.registry, self.package_name, group_name, inventory_name)
+
+        relative_url_path, _, symbol_id = location.partition("#")
+        # Intern fields that have shared content so we're not storing unique strings for every object
+        doc_item = DocItem(
+            self.package_name,
+            group_name,
+            self.base_url,
+            sys.intern(relative_url_path),
+            symbol_id,
+        )
+        self.registry.add(symbol_name, doc_item, inventory_name)
 
 
 class Docs(commands.Cog):
     """A set of commands for querying & displaying documentation."""
-    DOC_SYMBOLS = {}
     ALL_PACKAGES = []
 
     def __init__(self, bot: Union[Client, Bot], *, limit: int = 4):
@@ -75,98 +265,347 @@ class Docs(commands.Cog):
         self.base_urls = {}
         self.bot = bot
         self.limit = limit
-        self.doc_symbols: Dict[str, DocItem] = {}  # Maps symbol names to objects containing their metadata.
-        self.item_fetcher = batch_parser.BatchParser()
+        # Maps symbol names to objects containing their metadata.
+        # The registry isn't modified once it's in use, updates are applied to a copy which then replaces it.
+        self.doc_symbols = SymbolRegistry()
+        self.item_fetcher = batch_parser.BatchParser(lambda doc_item: self.doc_symbols.page_items(doc_item))
+        # Indices over the names in `doc_symbols`, rebuilt in a thread whenever the registry is replaced.
+        # Until the new ones are built the previous ones stay in use, with the names no longer stored filtered out.
+        # Lookups and autocompletion scan every name with `finder` while they're None.
+        self.search_index: Optional[SearchIndex] = None
+        # Only built if NumPy is installed, scores all names at once for lookups the indices can't answer.
+        self.vector_scorer: Optional[VectorScorer] = None
+        # Corrects typos in lookups whose best fuzzy match spans more than `typo_slack` characters beyond the query.
+        self.typo_index: Optional[TypoIndex] = None
+        self.typo_slack = 2
+        self.autocomplete_index: Optional[AutocompleteIndex] = None
+        # Candidates of every user's last autocomplete query, narrowed down while they keep typing.
+        self.autocomplete_cache = AutocompleteCache(maxsize=256, ttl=30)
+        # Incremented whenever `doc_symbols` is replaced, resolved queries are cached along with it.
+        self.registry_generation = 0
+        self.query_cache = QueryCache(maxsize=512)
 
         self.inventory_scheduler = Scheduler(self.__class__.__name__)
+        # Held while a copy of the registry is being updated, so concurrent updates don't replace each other's copies.
+        self.registry_lock = asyncio.Lock()
+        # Held while a package's changes are applied to a registry copy in batches, see `PackageUpdate`.
+        self.package_update_lock = asyncio.Lock()
+
+        # Connection pooling and timeouts of the HTTP session shared by every inventory and page fetch.
+        self.http_limit_per_host = 8
+        self.http_dns_cache_ttl = 300
+        self.http_keepalive_timeout = 60
+        self.http_timeout = aiohttp.ClientTimeout(sock_connect=5, sock_read=5)
+        self._http_session: Optional[aiohttp.ClientSession] = None
+
+        # Number of worker processes inventories are parsed in after being downloaded,
+        # if 0 they're parsed on the event loop while being downloaded.
+        self.parse_workers = 0
+        self._parse_executor: Optional[ProcessPoolExecutor] = None
+
+        # Max number of inventories fetched at once during a refresh, packages from `PRIORITY_PACKAGES` go first.
+        self.refresh_concurrency = 4
+        self.refresh_timings: Dict[str, RefreshTiming] = {}
+
+        # File the symbol registry is saved to after every refresh and restored from on load, disabled if None.
+        self.snapshot_path: Optional[str] = None
+        # The registry generation the snapshot was last saved or restored from, it's not saved again until that changes.
+        self._snapshot_generation: Optional[int] = None
 
-        self.refresh_event = asyncio.Event()
-        self.refresh_event.set()
-        self.symbol_get_event = SharedEvent()
         self.items = (
             ('python', 'https://docs.python.org/3/'),
             ('disnake', 'https://disnake.readthedocs.io/en/latest/')
         )
 
-    def update_single(self, package_name: str, base_url: str, inventory: InventoryDict) -> None:
+    @property
+    def http_session(self) -> aiohttp.ClientSession:
+        """
+        The `ClientSession` used for all documentation network I/O.
+        It's created on first use so that it's bound to the running loop, and kept alive until the cog is unloaded
+        so connections to the documentation hosts are reused across inventories and pages.
+        """
+        if self._http_session is None or self._http_session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=self.http_limit_per_host,
+                ttl_dns_cache=self.http_dns_cache_ttl,
+                keepalive_timeout=self.http_keepalive_timeout,
+            )
+            self._http_session = aiohttp.ClientSession(connector=connector, timeout=self.http_timeout)
+        return self._http_session
+
+    @property
+    def parse_executor(self) -> Optional[ProcessPoolExecutor]:
+        """The process pool inventories are parsed in, None if `parse_workers` is 0."""
+        if self._parse_executor is None and self.parse_workers:
+            self._parse_executor = ProcessPoolExecutor(max_workers=self.parse_workers)
+        return self._parse_executor
+
+    @asynccontextmanager
+    async def updating_registry(self, *, full: bool = False) -> AsyncIterator[Tuple[SymbolRegistry, Dict[str, str]]]:
+        """
+        Yield copies of `doc_symbols` and `base_urls` to apply updates to, which replace them once the block is exited.
+        Lookups keep using the current registry until then, and aren't affected if the block raises.
+        The copies are dropped if nothing was changed, so the current indices and caches stay in use.
+        If `full` is True, empty ones are yielded instead.
+        """
+        async with self.registry_lock:
+            if full:
+                registry, base_urls = SymbolRegistry(), {}
+            else:
+                registry, base_urls = self.doc_symbols.copy(), self.base_urls.copy()
+            mutation_count = registry.mutation_count
+            yield registry, base_urls
+            if full or registry.mutation_count != mutation_count or base_urls != self.base_urls:
+                self._set_registry(registry, base_urls)
+
+    async def update_single(
+        self,
+        package_name: str,
+        base_url: str,
+        inventory: InventoryDict,
+        registry: SymbolRegistry,
+        base_urls: Dict[str, str]
+    ) -> None:
         """
-        Build the inventory for a single package and adds its items to the cache.
+        Build the inventory for a single package and apply it to `registry`, see `updating_registry`.
         Where:
             * `package_name` is the package name to use in logs and when qualifying symbols
             * `base_url` is the root documentation URL for the specified package, used to build
                 absolute paths that link to specific symbols
             * `package` is the content of a intersphinx inventory.
+        See `PackageUpdate` for how the inventory is applied if the package is already loaded.
         """
-        self.base_urls[package_name] = base_url
-        if package_name not in self.ALL_PACKAGES:
-            self.ALL_PACKAGES.append(package_name)
+        update = PackageUpdate(self, registry, base_urls, package_name, base_url)
+        update.add_entries([(type_, name, location) for type_, items in inventory.items() for name, location in items])
+        await update.finish()
 
-        for group, items in inventory.items():
-            for symbol_name, relative_doc_url in items:
+    @staticmethod
+    def remove_package_symbols(package_name: str, registry: SymbolRegistry, base_urls: Dict[str, str]) -> None:
+        """Remove all symbols of `package_name` from `registry` along with the package itself from `base_urls`."""
+        registry.remove_package(package_name)
+        base_urls.pop(package_name, None)
+
+    def _purge_package(self, package_name: str) -> None:
+        """Drop everything cached or queued for `package_name` once its symbols were removed or replaced."""
+        if package_name in self.inventory_scheduler:
+            self.inventory_scheduler.cancel(package_name)
+        self.item_fetcher.remove_package(package_name)
+        doc_cache.delete(package_name)
+
+    async def remove_package(self, package_name: str) -> bool:
+        """
+        Remove `package_name` along with all of its symbols, cached Markdown and queued parsing.
+        The package is also removed from `items`, so later refreshes don't add it back, and from the local build directories pages are read from.
+        Return False if the package isn't loaded, configured in `items` or scheduled to be fetched.
+        """
+        package_base_urls = {item[1] for item in self.items if item[0] == package_name}
+        if package_name not in self.base_urls and not package_base_urls and package_name not in self.inventory_scheduler:
+            return False
+
+        if package_name in self.base_urls:
+            package_base_urls.add(self.base_urls[package_name])
+            async with self.updating_registry() as (registry, base_urls):
+                self.remove_package_symbols(package_name, registry, base_urls)
+        self.items = tuple(item for item in self.items if item[0] != package_name)
+        if package_name in self.ALL_PACKAGES:
+            self.ALL_PACKAGES.remove(package_name)
+        self._purge_package(package_name)
+        for base_url in package_base_urls:
+            self.item_fetcher.local_roots.pop(base_url, None)
+        await self.save_snapshot()
+        return True
+
+    async def replace_package(self, package_name: str, base_url: str, inventory: InventoryDict) -> None:
+        """
+        Replace all symbols of `package_name` with the ones from `inventory`, dropping its cached Markdown.
+        Unlike a refresh, which applies the difference to the current symbols, the package is rebuilt from scratch,
+        and the other packages are left untouched.
+        """
+        async with self.updating_registry() as (registry, base_urls):
+            self.remove_package_symbols(package_name, registry, base_urls)
+            await self.update_single(package_name, base_url, inventory, registry, base_urls)
+        self._purge_package(package_name)
+        await self.save_snapshot()
 
-                # e.g. get 'class' from 'py:class'
-                group_name = group.split(":")[1]
-                symbol_name = self.ensure_unique_symbol_name(
-                    package_name,
-                    group_name,
-                    symbol_name,
-                )
+    def _set_registry(self, registry: SymbolRegistry, base_urls: Dict[str, str]) -> None:
+        """
+        Replace `doc_symbols` and `base_urls`, and start building the indices of the new registry.
+        The current indices keep serving lookups until then, they may miss the new symbols in the meantime.
+        """
+        self.doc_symbols, self.base_urls = registry, base_urls
+        self.autocomplete_cache.clear()
+        self.registry_generation += 1
+        self.query_cache.clear()
+        create_task(self._build_indices(registry), name="Docs index build")
+
+    async def _build_indices(self, registry: SymbolRegistry) -> None:
+        """Build the indices of `registry` in a thread, and use them if the registry is still the current one."""
+        loop = asyncio.get_running_loop()
+        package_symbols = {package: registry.package_symbols(package) for package in registry.packages()}
+        autocomplete_names = [symbol for symbol in registry if symbol[0] in st.ascii_lowercase]
+        builders = [
+            ("search_index", partial(SearchIndex, package_symbols)),
+            ("autocomplete_index", partial(AutocompleteIndex, autocomplete_names)),
+            ("typo_index", partial(TypoIndex, registry.keys())),
+        ]
+        if HAS_NUMPY:
+            # Built first as it only takes a fraction of the time the indices take.
+            builders.insert(0, ("vector_scorer", partial(VectorScorer, package_symbols)))
+
+        for attribute, build in builders:
+            index = await loop.run_in_executor(None, build)
+            if self.doc_symbols is not registry:
+                return
+            setattr(self, attribute, index)
+            # Cached autocomplete candidates may be positions in the replaced index.
+            self.autocomplete_cache.clear()
+        # Queries resolved with the previous indices may resolve differently now.
+        self.query_cache.clear()
 
-                relative_url_path, _, symbol_id = relative_doc_url.partition("#")
-                # Intern fields that have shared content so we're not storing unique strings for every object
+    @staticmethod
+    def _load_snapshot_registry(path: str) -> Optional[Tuple[snapshot.Snapshot, SymbolRegistry]]:
+        """
+        Load the snapshot at `path` and build a registry from its rows, return None if there's no usable snapshot.
+        This doesn't need the event loop, so it's ran in an executor.
+        """
+        if (stored := snapshot.load_snapshot(path)) is None:
+            return None
+
+        registry = SymbolRegistry()
+        try:
+            for row in stored.rows:
                 doc_item = DocItem(
-                    package_name,
-                    sys.intern(group_name),
-                    base_url,
-                    sys.intern(relative_url_path),
-                    symbol_id,
+                    row.package,
+                    row.group,
+                    stored.base_urls[row.package],
+                    row.relative_url_path,
+                    row.symbol_id,
                 )
-                self.doc_symbols[symbol_name] = doc_item
-                self.DOC_SYMBOLS[symbol_name] = doc_item
-                self.item_fetcher.add_item(doc_item)
+                registry.add(row.symbol_name, doc_item, row.inventory_name)
+        except Exception:
+            log.warning(f"Ignoring the malformed snapshot at {path}.", exc_info=True)
+            return None
+        return stored, registry
+
+    async def restore_snapshot(self) -> bool:
+        """
+        Restore the symbols and inventory validators saved to `snapshot_path`.
+        Return True if a snapshot was restored, False if snapshots are disabled or there's no usable snapshot.
+        """
+        if self.snapshot_path is None:
+            return False
+
+        loop = asyncio.get_running_loop()
+        restored = await loop.run_in_executor(None, self._load_snapshot_registry, self.snapshot_path)
+        if restored is None:
+            return False
+
+        stored, registry = restored
+        inventory_validators.update(stored.validators)
+        for package_name in stored.base_urls:
+            if package_name not in self.ALL_PACKAGES:
+                self.ALL_PACKAGES.append(package_name)
+        self._set_registry(registry, stored.base_urls)
+        self._snapshot_generation = self.registry_generation
+        return True
+
+    async def save_snapshot(self) -> None:
+        """
+        Save the current symbols along with the inventory validators to `snapshot_path`, if it's set.
+        Nothing is written if the registry wasn't replaced since the snapshot was last saved or restored.
+        """
+        if self.snapshot_path is None or self._snapshot_generation == self.registry_generation:
+            return
+
+        generation = self.registry_generation
+        loop = asyncio.get_running_loop()
+        # The registry and base urls are replaced rather than modified, so they can be read from another thread.
+        await loop.run_in_executor(
+            None,
+            snapshot.dump_snapshot,
+            self.snapshot_path,
+            self.base_urls,
+            self.doc_symbols,
+            dict(inventory_validators),
+        )
+        self._snapshot_generation = generation
 
     async def update_or_reschedule_inventory(
         self,
         api_package_name: str,
         base_url: str,
         inventory_url: str,
+        registry: Optional[SymbolRegistry] = None,
+        base_urls: Optional[Dict[str, str]] = None,
+        *,
+        attempt: int = 1,
     ) -> None:
         """
         Update the cog's inventories, or reschedule this method to execute again if the remote inventory is unreachable.
-        The first attempt is rescheduled to execute in `FETCH_RESCHEDULE_DELAY.first` minutes, the subsequent attempts
-        in `FETCH_RESCHEDULE_DELAY.repeated` minutes.
+        The delay before each rescheduled attempt grows as configured by `FETCH_RESCHEDULE_DELAY`.
+        Inventories that are missing or invalid are not rescheduled.
+        If the package is already loaded, the inventory is requested conditionally
+        and its symbols are left untouched when it didn't change.
+        The inventory is applied to `registry` and `base_urls`, or through `updating_registry` if they're None,
+        in which case packages that were removed from `items` in the meantime are skipped.
         """
-        package = await fetch_inventory(inventory_url)
+        if registry is None:
+            async with self.updating_registry() as (registry, base_urls):
+                # Cancelling a scheduled fetch doesn't stop one that's already waiting for the lock.
+                if not any(item[0] == api_package_name for item in self.items):
+                    log.debug(f"Not updating {api_package_name}: it was removed while waiting to be updated.")
+                    return
+                await self.update_or_reschedule_inventory(
+                    api_package_name, base_url, inventory_url, registry, base_urls, attempt=attempt
+                )
+            return
 
-        if not package:
+        if not base_url:
+            base_url = self.base_url_from_inventory_url(inventory_url)
+
+        start = time.perf_counter()
+        try:
+            update = await stream_inventory(
+                self.http_session,
+                inventory_url,
+                partial(PackageUpdate, self, registry, base_urls, api_package_name, base_url),
+                conditional=api_package_name in base_urls,
+                executor=self.parse_executor
+            )
+        except InvalidInventoryError as e:
+            # Nothing was applied, the package keeps the symbols it had.
+            log.warning(f"Not updating {api_package_name}: {e}")
+            return
+        elapsed = time.perf_counter() - start
+
+        if update is NOT_MODIFIED:
+            self.refresh_timings[api_package_name] = RefreshTiming(elapsed, 0.0)
+
+        elif update is None:
             if api_package_name in self.inventory_scheduler:
                 self.inventory_scheduler.cancel(api_package_name)
-                delay = FETCH_RESCHEDULE_DELAY.repeated
-            else:
-                delay = FETCH_RESCHEDULE_DELAY.first
+            delay = backoff_delay(attempt, **vars(FETCH_RESCHEDULE_DELAY))
             self.inventory_scheduler.schedule_later(
                 delay * 60,
                 api_package_name,
-                self.update_or_reschedule_inventory(api_package_name, base_url, inventory_url),
+                self.update_or_reschedule_inventory(api_package_name, base_url, inventory_url, attempt=attempt + 1),
             )
         else:
-            if not base_url:
-                base_url = self.base_url_from_inventory_url(inventory_url)
-            self.update_single(api_package_name, base_url, package)
+            self.refresh_timings[api_package_name] = RefreshTiming(elapsed - update.update_time, update.update_time)
 
-    def ensure_unique_symbol_name(self, package_name: str, group_name: str, symbol_name: str) -> str:
+    def ensure_unique_symbol_name(self, registry: SymbolRegistry, package_name: str, group_name: str, symbol_name: str) -> str:
         """
-        Ensure `symbol_name` doesn't overwrite an another symbol in `doc_symbols`.
+        Ensure `symbol_name` doesn't overwrite an another symbol in `registry`.
         For conflicts, rename either the current symbol or the existing symbol with which it conflicts.
         Store the new name in `renamed_symbols` and return the name to use for the symbol.
         If the existing symbol was renamed or there was no conflict, the returned name is equivalent to `symbol_name`.
         """
-        if (item := self.doc_symbols.get(symbol_name)) is None:
+        if (item := registry.get(symbol_name)) is None:
             return symbol_name  # There's no conflict so it's fine to simply use the given symbol name.
 
         def rename(prefix: str, *, rename_extant: bool = False) -> str:
             new_name = f"{prefix}.{symbol_name}"
-            if new_name in self.doc_symbols:
+            if new_name in registry:
                 # If there's still a conflict, qualify the name further.
                 if rename_extant:
                     new_name = f"{item.package}.{item.group}.{symbol_name}"
@@ -175,8 +614,7 @@ class Docs(commands.Cog):
 
             if rename_extant:
                 # Instead of renaming the current symbol, rename the symbol with which it conflicts.
-                self.doc_symbols[new_name] = self.doc_symbols[symbol_name]
-                self.DOC_SYMBOLS[new_name] = self.DOC_SYMBOLS[symbol_name]
+                registry.rename(symbol_name, new_name)
                 return symbol_name
             else:
                 return new_name
@@ -202,32 +640,114 @@ class Docs(commands.Cog):
         else:
             return rename(item.group, rename_extant=True)
 
-    async def refresh_inventories(self) -> None:
-        """Refresh internal documentation inventories."""
-        self.refresh_event.clear()
-        await self.symbol_get_event.wait()
-        self.inventory_scheduler.cancel_all()
-
-        self.base_urls.clear()
-        self.doc_symbols.clear()
-        await self.item_fetcher.clear()
-
-        coros = [
-            self.update_or_reschedule_inventory(
-                item[0], item[1], item[1] + 'objects.inv'
-            ) for item in self.items
-        ]
-        asyncio.gather(*coros)
+    async def refresh_inventories(self, *, full: bool = False) -> None:
+        """
+        Refresh internal documentation inventories.
+        Packages are updated with the difference to their new inventory, and packages that are no longer in `items`
+        are removed. If `full` is True, all symbols are cleared and rebuilt from freshly downloaded inventories instead.
+        The refreshed symbols are built in the background and replace the current ones once the refresh is done,
+        so lookups are served from the current symbols in the meantime.
+        """
+        async with self.updating_registry(full=full) as (registry, base_urls):
+            self.inventory_scheduler.cancel_all()
+            for package_name in set(base_urls).difference(item[0] for item in self.items):
+                self.remove_package_symbols(package_name, registry, base_urls)
+            await self._refresh_packages(registry, base_urls)
+
+        if full:
+            await self.item_fetcher.clear()
+        for package_name, timing in self.refresh_timings.items():
+            log.info(f"Refreshed {package_name}: fetched in {timing.fetch:.3f}s, updated in {timing.update:.3f}s.")
+        log.info(f"Query cache hit ratio: {self.query_cache.hit_ratio:.1%} of {self.query_cache.hits + self.query_cache.misses} lookups.")
+        await self.save_snapshot()
+
+    async def _refresh_packages(self, registry: SymbolRegistry, base_urls: Dict[str, str]) -> None:
+        """Update all packages from `items` in `registry` and `base_urls`, fetching up to `refresh_concurrency` at once."""
+        self.refresh_timings.clear()
+        semaphore = asyncio.Semaphore(self.refresh_concurrency)
+
+        async def refresh_package(package_name: str, base_url: str, inventory_url: str) -> None:
+            async with semaphore:
+                try:
+                    await self.update_or_reschedule_inventory(package_name, base_url, inventory_url, registry, base_urls)
+                except Exception as e:
+                    # One package failing shouldn't abort the refresh of the others, it keeps the symbols it had.
+                    log.error(f"Failed to refresh {package_name}.", exc_info=e)
+
+        # The semaphore is acquired in order, so sorting the packages makes the priority ones get fetched first.
+        items = sorted(
+            self.items,
+            key=lambda item: PRIORITY_PACKAGES.index(item[0]) if item[0] in PRIORITY_PACKAGES else len(PRIORITY_PACKAGES)
+        )
+        coros = []
+        for package_name, base_url, *build_directory in items:
+            if not is_http_url(base_url):
+                # Links to the symbols are built from the base url, local documentation goes in the third element.
+                log.warning(f"Not loading {package_name}: its base url {base_url} isn't an http(s) url.")
+                continue
+            # Packages with a local build directory have their inventory and pages read from it.
+            if build_directory and (build_path := local_path(build_directory[0])) is not None:
+                self.item_fetcher.local_roots[base_url] = build_path
+                inventory_url = os.path.join(build_path, 'objects.inv')
+            else:
+                inventory_url = base_url + 'objects.inv'
+            coros.append(refresh_package(package_name, base_url, inventory_url))
+        await asyncio.gather(*coros)
 
-        self.refresh_event.set()
+    def split_package_scope(self, symbol_name: str) -> Tuple[Optional[str], str]:
+        """
+        Split a `package:symbol` query into the package and the symbol name.
+        The package is None if the name doesn't start with the name of a stored package followed by a colon.
+        """
+        package, separator, scoped_name = symbol_name.partition(":")
+        if separator and package in self.base_urls:
+            return package, scoped_name
+        return None, symbol_name
 
-    def get_symbol_item(self, symbol_name: str) -> List[str, Optional[DocItem]]:
+    def get_symbol_item(self, symbol_name: str, package: Optional[str] = None) -> List[str, Optional[DocItem]]:
         """
         Get the `DocItem` and the symbol name used to fetch it from the `doc_symbols` dict.
+        If `package` is given, only the symbols from that package are searched.
         """
         doc_item = self.doc_symbols.get(symbol_name)
-        doc_symbols = list(self.doc_symbols.items())
-        matches = finder(symbol_name, doc_symbols, key=lambda t: t[0], lazy=False)[:self.limit]
+        if doc_item is not None and package is not None and doc_item.package != package:
+            doc_item = None
+        if doc_item is None:
+            # Case variants of a full name, like `DISNAKE.EMBED`, are exact matches as well.
+            folded_names = [
+                name for name in self.doc_symbols.casefold_symbols(symbol_name)
+                if package is None or self.doc_symbols.symbol_package(name) == package
+            ]
+            if folded_names:
+                symbol_name = min(folded_names)
+                doc_item = self.doc_symbols[symbol_name]
+        # Symbols whose name ends with the given one, like `disnake.Embed` for `embed`, shortest names first.
+        short_names = sorted(
+            (
+                name for name in self.doc_symbols.segment_symbols(symbol_name)
+                if package is None or self.doc_symbols.symbol_package(name) == package
+            ),
+            key=lambda name: (len(name), name),
+        )
+        if doc_item is not None or short_names:
+            # Only fall back to fuzzy matching if the name isn't known in either form.
+            names = [name for name in short_names if name != symbol_name][:self.limit]
+        elif self.search_index is not None:
+            # The index may still be the one of the previous registry.
+            names = [name for name in self.search_index.search(symbol_name, self.limit, package) if name in self.doc_symbols]
+        elif self.vector_scorer is not None:
+            names = [name for name in self.vector_scorer.find(symbol_name, self.limit, package) if name in self.doc_symbols]
+        else:
+            candidates = self.doc_symbols.keys() if package is None else self.doc_symbols.package_symbols(package)
+            names = finder(symbol_name, candidates, lazy=False, k=self.limit)
+
+        if doc_item is None and not short_names and self.typo_index is not None:
+            # Typos leave either no fuzzy matches, or ones with the characters scattered over a longer name.
+            best_span = match_span(symbol_name, names[0]) if names else None
+            if best_span is None or best_span > len(symbol_name) + self.typo_slack:
+                names = self.typo_symbols(symbol_name, package) or names
+        # Items are only materialized for the matches, the registry doesn't store them.
+        matches = [(match, self.doc_symbols[match]) for match in names]
         if doc_item is not None:
             res = (symbol_name, doc_item)
             if res in matches:
@@ -235,6 +755,27 @@ class Docs(commands.Cog):
             matches = [res, *matches]
         return matches
 
+    def typo_symbols(self, symbol_name: str, package: Optional[str] = None) -> List[str]:
+        """
+        Return the names of up to `limit` symbols that match a correction of the typos in `symbol_name`.
+        A correction matches the symbols whose name ends with it, the closest corrections and shortest names come first.
+        """
+        names = []
+        for _distance, correction in self.typo_index.corrections(symbol_name):
+            corrected_names = sorted(
+                (
+                    name for name in self.doc_symbols.segment_symbols(correction.rpartition(".")[2])
+                    if (name.casefold() == correction or name.casefold().endswith("." + correction)) and
+                    (package is None or self.doc_symbols.symbol_package(name) == package) and
+                    name not in names
+                ),
+                key=lambda name: (len(name), name),
+            )
+            names.extend(corrected_names)
+            if len(names) >= self.limit:
+                break
+        return names[:self.limit]
+
     async def get_symbol_markdown(self, doc_item: DocItem) -> str:
         """
         Get the Markdown from the symbol `doc_item` refers to.
@@ -244,7 +785,7 @@ class Docs(commands.Cog):
         markdown = doc_cache.get(doc_item)
         if markdown is None:
             try:
-                markdown = await self.item_fetcher.get_markdown(doc_item)
+                markdown = await self.item_fetcher.get_markdown(doc_item, self.http_session)
 
             except aiohttp.ClientError:
                 return "Unable to parse the requested symbol due to a network error."
@@ -257,29 +798,45 @@ class Docs(commands.Cog):
 
         return markdown
 
-    async def create_symbol_embed(self, symbol_name: str) -> Optional[List[disnake.Embed]]:
+    async def create_symbol_page(self, symbol_name: str, doc_item: DocItem) -> disnake.Embed:
+        """Build the embed for the matched `symbol_name`, fetching the Markdown of `doc_item` if it isn't cached."""
+        return disnake.Embed(
+            title=disnake.utils.escape_markdown(symbol_name),
+            url=f"{doc_item.url}#{doc_item.symbol_id}",
+            description=await self.get_symbol_markdown(doc_item)
+        )
+
+    async def create_symbol_embed(self, symbol_name: str, package: Optional[str] = None) -> Optional[List[EmbedPage]]:
         """
         Attempt to scrape and fetch the data for the given `symbol_name`, and build an embed from its contents.
         If the symbol is known, an Embed with documentation about it is returned.
+        If `package` is given, only the symbols from that package are searched.
+        The other matches are only built right away if their Markdown is cached,
+        otherwise they're coroutine functions that build the embed when the paginator shows their page.
         """
-        if not self.refresh_event.is_set():
-            await self.refresh_event.wait()
-        # Ensure a refresh can't run in case of a context switch until the with block is exited
-        with self.symbol_get_event:
-            data = self.get_symbol_item(symbol_name)
-            if len(data) == 0:
-                return None
-            embeds = []
-            for i in data:
-                symbol_name, doc_item = i
-
-                embed = disnake.Embed(
-                    title=disnake.utils.escape_markdown(symbol_name),
-                    url=f"{doc_item.url}#{doc_item.symbol_id}",
-                    description=await self.get_symbol_markdown(doc_item)
-                )
-                embeds.append(embed)
-            return embeds
+        # The registry generation in the key keeps results from a replaced registry from being served.
+        symbol_name = clean_symbol_name(symbol_name)
+        key = (self.registry_generation, symbol_name, package)
+        if (cached := self.query_cache.get(key)) is not None and cached.embeds is not None:
+            return [disnake.Embed.from_dict(payload) for payload in cached.embeds] or None
+
+        # Refreshes replace the registry instead of modifying it, so the items stay valid while the Markdown is fetched.
+        data = cached.symbols if cached is not None else self.get_symbol_item(symbol_name, package)
+        embeds: List[EmbedPage] = []
+        for index, (symbol_name, doc_item) in enumerate(data):
+            # Matches whose Markdown was cached by earlier lookups cost nothing to build.
+            if index == 0 or doc_cache.get(doc_item) is not None:
+                embeds.append(await self.create_symbol_page(symbol_name, doc_item))
+            else:
+                embeds.append(partial(self.create_symbol_page, symbol_name, doc_item))
+
+        # Only the symbols are kept if any of them couldn't be parsed or wasn't built yet, so they're built again next time.
+        parsed = all(isinstance(embed, disnake.Embed) for embed in embeds) and all(
+            doc_cache.get(doc_item) is not None for _, doc_item in data
+        )
+        if key[0] == self.registry_generation:
+            self.query_cache.set(key, CachedQuery(data, [embed.to_dict() for embed in embeds] if parsed else None))
+        return embeds or None
 
     @commands.slash_command(name="docs")
     async def docs_group(*_) -> None:
@@ -293,14 +850,18 @@ class Docs(commands.Cog):
         inter: AppCmdInter,
         *,
         symbol_name: str = Param(
-            description='The doc to look for'
+            description='The doc to look for, prefix it with `package:` to only look in that package'
+        ),
+        package: Optional[str] = Param(
+            None,
+            description='The package to look in, all packages are searched if not given'
         )
     ) -> None:
         """Return a documentation embed for a given symbol."""
 
         await inter.response.defer()
-        symbol = symbol_name.strip("`")
-        doc_embeds = await self.create_symbol_embed(symbol)
+        scope, symbol = self.split_package_scope(clean_symbol_name(symbol_name))
+        doc_embeds = await self.create_symbol_embed(symbol, package or scope)
 
         if doc_embeds is None:
             return await send_denial(inter, "No documentation found for the requested symbol.", ephemeral=True)
@@ -317,12 +878,38 @@ class Docs(commands.Cog):
     @get_command.autocomplete("symbol_name")
     async def get_doc_autocomp(self, inter: AppCmdInter, string: str):
         abc = st.ascii_lowercase
-        doc_symbols = []
-        for symbol in self.DOC_SYMBOLS:
-            if symbol[0] in abc:
-                doc_symbols.append(symbol)
-        matches = finder(string, doc_symbols, lazy=False)[:25]
-        return matches
+        scope, string = self.split_package_scope(string)
+        package = inter.filled_options.get("package") or scope
+
+        def in_scope(symbol: str) -> bool:
+            # The indices may still be the ones of the previous registry.
+            return symbol in self.doc_symbols and (package is None or self.doc_symbols.symbol_package(symbol) == package)
+
+        # Cached candidates aren't limited to the package, so they stay valid if it changes.
+        candidates = self.autocomplete_cache.get(inter.author.id, string)
+        if self.autocomplete_index is not None and not isinstance(candidates, list):
+            # Names or dotted segments starting with the string.
+            positions = self.autocomplete_index.key_range(string, candidates)
+            if positions:
+                self.autocomplete_cache.set(inter.author.id, string, positions)
+                return self.autocomplete_index.range_names(positions, 25, in_scope)
+            if self.search_index is not None and self.vector_scorer is None:
+                # Fuzzy matches if there are none, the index only finds the best ones so they can't be narrowed down.
+                # The vector scorer finds all of them, which are cached below.
+                return [symbol for symbol in self.search_index.search(string, 25, package) if symbol[0] in abc and in_scope(symbol)]
+
+        if isinstance(candidates, list):
+            matches = finder(string, candidates, lazy=False)
+        elif self.vector_scorer is not None:
+            matches = [symbol for symbol in self.vector_scorer.find(string) if symbol[0] in abc]
+        else:
+            matches = finder(string, [symbol for symbol in self.doc_symbols if symbol[0] in abc], lazy=False)
+        self.autocomplete_cache.set(inter.author.id, string, matches)
+        return list(islice(filter(in_scope, matches), 25))
+
+    @get_command.autocomplete("package")
+    async def get_package_autocomp(self, inter: AppCmdInter, string: str):
+        return [package for package in self.base_urls if package.startswith(string.lower())][:25]
 
     @staticmethod
     def base_url_from_inventory_url(inventory_url: str) -> str:
@@ -341,6 +928,9 @@ class Docs(commands.Cog):
 
         await inter.response.defer(ephemeral=True)
         package_name = await PackageName.convert(inter, package_name)
+        # Links to the symbols are built from the inventory url, and local paths shouldn't be read from the command.
+        if not is_http_url(inventory):
+            raise commands.BadArgument("The inventory must be at an http(s) url, its links are built from it.")
         inventory = await Inventory.convert(inter, inventory)
 
         inventory_url, inventory_dict = inventory
@@ -354,9 +944,24 @@ class Docs(commands.Cog):
         if not base_url:
             base_url = self.base_url_from_inventory_url(inventory_url)
 
-        self.update_single(package_name, base_url, inventory_dict)
+        await self.replace_package(package_name, base_url, inventory_dict)
         await inter.followup.send(f"Added the package `{package_name}` the inventories.", ephemeral=True)
 
+    @docs_group.sub_command(name="remove-doc")
+    @commands.is_owner()
+    async def remove_command(
+        self,
+        inter: AppCmdInter,
+        package_name: str
+    ) -> None:
+        """Removes a documentation package and all of its symbols from the inventory."""
+
+        await inter.response.defer(ephemeral=True)
+        if not await self.remove_package(package_name):
+            return await send_denial(inter, f"There's no package named `{package_name}` in the inventories.", ephemeral=True)
+
+        await inter.followup.send(f"Removed the package `{package_name}` from the inventories.", ephemeral=True)
+
     @docs_group.sub_command(name="refresh")
     @commands.is_owner()
     async def refresh_command(
@@ -376,9 +981,18 @@ class Docs(commands.Cog):
         if removed := ", ".join(old_inventories - new_inventories):
             removed = "- " + removed
 
+        timings = "\n".join(
+            f"{package_name}: fetch {timing.fetch * 1000:.0f}ms, update {timing.update * 1000:.0f}ms"
+            for package_name, timing in self.refresh_timings.items()
+        )
+        description = f"```diff\n{added}\n{removed}```" if added or removed else ""
+        if timings:
+            description += f"```\n{timings}```"
+        description += f"Query cache hit ratio: {self.query_cache.hit_ratio:.1%}"
+
         embed = disnake.Embed(
             title="Inventories refreshed",
-            description=f"```diff\n{added}\n{removed}```" if added or removed else ""
+            description=description
         )
         await inter.followup.send(embed=embed, ephemeral=True)
 
@@ -390,14 +1004,28 @@ class Docs(commands.Cog):
     ) -> None:
         """Clears the cache while refreshing the inventories."""
 
+        # Refreshing waits for every inventory, which takes longer than Discord waits for a response.
+        await inter.response.defer(ephemeral=True)
         doc_cache.delete()
-        await self.refresh_inventories()
-        await inter.send("Successfully cleared the cache and refreshed the inventories.", ephemeral=True)
+        await self.refresh_inventories(full=True)
+        await inter.followup.send("Successfully cleared the cache and refreshed the inventories.", ephemeral=True)
 
     def cog_unload(self) -> None:
-        """Clear scheduled inventories, queued symbols and cleanup task on cog unload."""
+        """
+        Clear scheduled inventories, queued symbols and cleanup task on cog unload.
+        Also close the HTTP session and shut down the parsing process pool.
+        """
         self.inventory_scheduler.cancel_all()
         create_task(self.item_fetcher.clear(), name="Docs.item_fetcher unload clear")
+        if self._http_session is not None:
+            create_task(self._http_session.close(), name="Docs.http_session unload close")
+        if self._parse_executor is not None:
+            self._parse_executor.shutdown(wait=False)
+            self._parse_executor = None
 
     async def cog_load(self):
-        await self.refresh_inventories()
+        if await self.restore_snapshot():
+            # The stored symbols can be served right away, reconcile them with the remote inventories in the background.
+            create_task(self.refresh_inventories(), name="Docs snapshot refresh")
+        else:
+            await self.refresh_inventories()
@@ -3,7 +3,7 @@ import typing as t
 import re
 from ssl import CertificateError
 from aiohttp import ClientConnectorError
-from .inventory_parser import InventoryDict, fetch_inventory, FAILED_REQUEST_ATTEMPTS
+from .inventory_parser import InvalidInventoryError, InventoryDict, fetch_inventory, FAILED_REQUEST_ATTEMPTS
 
 
 def allowed_strings(*values, preserve_case: bool = False) -> t.Callable[[str], str]:
@@ -36,7 +36,12 @@ class Inventory(Converter):
     async def convert(ctx: Context, url: str) -> t.Tuple[str, InventoryDict]:
         """Convert url to Intersphinx inventory URL."""
         await ctx.trigger_typing()
-        if (inventory := await fetch_inventory(url)) is None:
+        cog = ctx.application_command.cog
+        try:
+            inventory = await fetch_inventory(cog.http_session, url, executor=cog.parse_executor)
+        except InvalidInventoryError as e:
+            raise BadArgument(str(e))
+        if inventory is None:
             raise BadArgument(
                 f"Failed to fetch inventory file after {FAILED_REQUEST_ATTEMPTS} attempts."
             )
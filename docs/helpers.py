@@ -1,4 +1,7 @@
+import os
 from typing import Optional
+from urllib.parse import urlsplit
+from urllib.request import url2pathname
 
 
 def find_nth_occurrence(string: str, substring: str, n: int) -> Optional[int]:
@@ -9,3 +12,17 @@ def find_nth_occurrence(string: str, substring: str, n: int) -> Optional[int]:
         if index == -1:
             return None
     return index
+
+
+def local_path(url: str) -> Optional[str]:
+    """Return the filesystem path `url` refers to if it's a `file://` url or an absolute path, None otherwise."""
+    if urlsplit(url).scheme == "file":
+        return url2pathname(urlsplit(url).path)
+    if os.path.isabs(url):
+        return url
+    return None
+
+
+def is_http_url(url: str) -> bool:
+    """Return True if `url` is an http or https url, which is what base urls of packages must be."""
+    return urlsplit(url).scheme in ("http", "https")
@@ -1,14 +1,47 @@
+import asyncio
+import mmap
+import os
 import re
 import zlib
+from abc import ABC, abstractmethod
 from collections import defaultdict
-from typing import AsyncIterator, DefaultDict, List, Optional, Tuple
+from concurrent.futures import Executor
+from types import SimpleNamespace
+from typing import AsyncIterator, Callable, DefaultDict, Dict, Iterator, List, Optional, Tuple, TypeVar, Union
+from urllib.parse import urlsplit
 
 import aiohttp
 
+from .helpers import local_path
+from .utils import CircuitBreaker, backoff_delay
+
 FAILED_REQUEST_ATTEMPTS = 3
+# Delay between the attempts of a fetch in seconds, see `utils.backoff_delay`.
+FETCH_BACKOFF = SimpleNamespace(base=1, factor=2, maximum=10, jitter=0.5)
+# Consecutive failed fetches after which a host is skipped, and for how many seconds.
+HOST_CIRCUIT_BREAKER = SimpleNamespace(threshold=5, cooldown=5 * 60)
+# Client errors which a retry may resolve, all others mean the inventory isn't there.
+RETRYABLE_STATUSES = (408, 425, 429)
+# Max number of entries passed to an `InventoryConsumer` at once, v2 inventories are also batched by decompressed chunk.
+# The event loop is given a chance to run other tasks between batches.
+ENTRY_BATCH_SIZE = 1000
 _V2_LINE_RE = re.compile(r'(?x)(.+?)\s+(\S*:\S*)\s+(-?\d+)\s+?(\S*)\s+(.*)')
 
 InventoryDict = DefaultDict[str, List[Tuple[str, str]]]
+# ("domain:role", "symbol_name", "relative_url_to_symbol")
+InventoryEntry = Tuple[str, str, str]
+ConsumerT = TypeVar("ConsumerT", bound="InventoryConsumer")
+
+# Returned by `stream_inventory` and `fetch_inventory` for conditional requests when the remote inventory didn't change.
+NOT_MODIFIED = object()
+# Maps inventory urls to the `ETag` and `Last-Modified` validators the inventory was last fetched with.
+inventory_validators: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+# Maps hosts to the circuit breaker tracking the failures of fetches from them.
+_host_breakers: Dict[str, CircuitBreaker] = {}
+
+
+class InvalidInventoryError(Exception):
+    """Raised when the inventory at an url can't be fetched or parsed, and retrying won't change that."""
 
 
 class ZlibStreamReader:
@@ -27,82 +60,352 @@ class ZlibStreamReader:
 
         yield decompressor.flush()
 
+    async def _read_line_blocks(self) -> AsyncIterator[bytes]:
+        """
+        Yield the decompressed data in blocks of whole lines, without the final newline.
+        Only the incomplete line at the end of a chunk is carried over to the next one,
+        so every decompressed byte is copied a constant number of times.
+        """
+        tail = b''
+        async for chunk in self._read_compressed_chunks():
+            end = chunk.rfind(b'\n')
+            if end == -1:
+                tail += chunk
+                continue
+            yield tail + chunk[:end]
+            tail = chunk[end + 1:]
+
+        if tail:
+            yield tail
+
     async def __aiter__(self) -> AsyncIterator[str]:
         """Yield lines of decompressed text."""
-        buf = b''
-        async for chunk in self._read_compressed_chunks():
-            buf += chunk
-            pos = buf.find(b'\n')
-            while pos != -1:
-                yield buf[:pos].decode()
-                buf = buf[pos + 1:]
-                pos = buf.find(b'\n')
+        async for block in self._read_line_blocks():
+            for line in block.split(b'\n'):
+                yield line.decode()
+
 
+def _parse_v1_line(line: bytes) -> InventoryEntry:
+    """Parse a single v1 inventory line into an inventory entry."""
+    name, type_, location = line.decode().rstrip().split(maxsplit=2)
+    # version 1 did not add anchors to the location
+    if type_ == "mod":
+        type_ = "py:module"
+        location += "#module-" + name
+    else:
+        type_ = "py:" + type_
+        location += "#" + name
+    return type_, name, location
 
-async def _load_v1(stream: aiohttp.StreamReader) -> InventoryDict:
-    invdata = defaultdict(list)
 
+async def _load_v1(stream: aiohttp.StreamReader) -> AsyncIterator[List[InventoryEntry]]:
+    entries = []
     async for line in stream:
-        name, type_, location = line.decode().rstrip().split(maxsplit=2)
-        # version 1 did not add anchors to the location
-        if type_ == "mod":
-            type_ = "py:module"
-            location += "#module-" + name
-        else:
-            type_ = "py:" + type_
-            location += "#" + name
-        invdata[type_].append((name, location))
-    return invdata
+        entries.append(_parse_v1_line(line))
+        if len(entries) == ENTRY_BATCH_SIZE:
+            yield entries
+            entries = []
+
+    if entries:
+        yield entries
 
 
-async def _load_v2(stream: aiohttp.StreamReader) -> InventoryDict:
-    invdata = defaultdict(list)
+def _parse_v2_block(block: bytes) -> List[InventoryEntry]:
+    """
+    Parse a block of whole v2 inventory lines into inventory entries.
+    Names of most symbols contain no whitespace, so a line is first split on its first four spaces;
+    lines where the fields don't line up, like names with spaces in them or no name, fall back to `_V2_LINE_RE`.
+    """
+    entries = []
+    for line in block.decode().split("\n"):
+        fields = line.split(" ", 4)
+        if len(fields) == 5 and fields[0] and ":" in fields[1] and fields[2].lstrip("-").isdigit():
+            name, type_, _prio, location, _dispname = fields  # ignore the parsed items we don't need
+        else:
+            m = _V2_LINE_RE.match(line.rstrip())
+            if m is None:
+                continue
+            name, type_, _prio, location, _dispname = m.groups()
 
-    async for line in ZlibStreamReader(stream):
-        m = _V2_LINE_RE.match(line.rstrip())
-        name, type_, _prio, location, _dispname = m.groups()  # ignore the parsed items we don't need
         if location.endswith("$"):
             location = location[:-1] + name
 
-        invdata[type_].append((name, location))
-    return invdata
+        entries.append((type_, name, location))
+    return entries
+
+
+def _decompress_line_blocks(data: memoryview) -> Iterator[bytes]:
+    """
+    Decompress the zlib `data` in `ZlibStreamReader.READ_CHUNK_SIZE` sized chunks,
+    yielding blocks of whole lines like `ZlibStreamReader._read_line_blocks`.
+    """
+    def decompressed_chunks() -> Iterator[bytes]:
+        decompressor = zlib.decompressobj()
+        chunk_size = ZlibStreamReader.READ_CHUNK_SIZE
+        for start in range(0, len(data), chunk_size):
+            yield decompressor.decompress(data[start:start + chunk_size])
+        yield decompressor.flush()
+
+    tail = b''
+    for chunk in decompressed_chunks():
+        end = chunk.rfind(b'\n')
+        if end == -1:
+            tail += chunk
+            continue
+        yield tail + chunk[:end]
+        tail = chunk[end + 1:]
+
+    if tail:
+        yield tail
+
+
+async def _load_v2(stream: aiohttp.StreamReader) -> AsyncIterator[List[InventoryEntry]]:
+    async for block in ZlibStreamReader(stream)._read_line_blocks():
+        yield _parse_v2_block(block)
+
+
+class InventoryConsumer(ABC):
+    """
+    Receives the entries of an inventory in batches while it's being parsed, see `stream_inventory`.
+    Each entry is a ("domain:role", "symbol_name", "relative_url_to_symbol") tuple.
+    """
+
+    @abstractmethod
+    def add_entries(self, entries: List[InventoryEntry]) -> None:
+        """Handle a batch of entries, the list is not used by the parser afterwards."""
+
+    async def finish(self) -> None:
+        """Called after all entries of the inventory were added, but not if the inventory couldn't be read whole."""
+
+
+async def _consume_entries(consumer: InventoryConsumer, entries: List[InventoryEntry]) -> None:
+    """Pass the already parsed `entries` to `consumer` in batches of `ENTRY_BATCH_SIZE`."""
+    for start in range(0, len(entries), ENTRY_BATCH_SIZE):
+        consumer.add_entries(entries[start:start + ENTRY_BATCH_SIZE])
+        await asyncio.sleep(0)
 
 
-async def _fetch_inventory(url: str) -> InventoryDict:
-    """Fetch, parse and return an intersphinx inventory file from an url."""
-    timeout = aiohttp.ClientTimeout(sock_connect=5, sock_read=5)
-    async with aiohttp.ClientSession() as session:
-        async with session.get(url, timeout=timeout, raise_for_status=True) as response:
-            stream = response.content
+class _InventoryCollector(InventoryConsumer):
+    """Collects the entries into an inventory dict."""
 
-            inventory_header = (await stream.readline()).decode().rstrip()
-            inventory_version = int(inventory_header[-1:])
-            await stream.readline()  # skip project name
-            await stream.readline()  # skip project version
+    def __init__(self):
+        self.inventory: InventoryDict = defaultdict(list)
 
-            if inventory_version == 1:
-                return await _load_v1(stream)
+    def add_entries(self, entries: List[InventoryEntry]) -> None:
+        inventory = self.inventory
+        for type_, name, location in entries:
+            inventory[type_].append((name, location))
+
+
+async def _fetch_inventory(
+    session: aiohttp.ClientSession,
+    url: str,
+    consumer_factory: Callable[[], InventoryConsumer],
+    conditional: bool,
+    executor: Optional[Executor]
+) -> Union[InventoryConsumer, object]:
+    """
+    Fetch and parse an intersphinx inventory file from an url into a consumer created by `consumer_factory`.
+    If `conditional` is True, the validators of the last fetch are sent along and `NOT_MODIFIED` is returned
+    if the server reports that the inventory didn't change.
+    Without an `executor` the inventory is passed to the consumer while it's being downloaded, otherwise
+    the whole file is downloaded first and then parsed in the executor.
+    """
+    headers = {}
+    if conditional and url in inventory_validators:
+        etag, last_modified = inventory_validators[url]
+        if etag is not None:
+            headers["If-None-Match"] = etag
+        if last_modified is not None:
+            headers["If-Modified-Since"] = last_modified
 
-            elif inventory_version == 2:
-                if b"zlib" not in await stream.readline():
-                    raise ValueError(f"Invalid inventory file at url {url}.")
-                return await _load_v2(stream)
+    async with session.get(url, headers=headers, raise_for_status=True) as response:
+        if response.status == 304:
+            return NOT_MODIFIED
 
+        validators = (response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        if executor is None:
+            consumer = consumer_factory()
+            async for entries in _parse_inventory(url, response.content):
+                consumer.add_entries(entries)
+                # Reading buffered data doesn't suspend, so a fast download could otherwise block the loop throughout.
+                await asyncio.sleep(0)
+        else:
+            data = await response.read()
+
+    if executor is not None:
+        entries = await asyncio.get_running_loop().run_in_executor(executor, parse_inventory, url, data)
+        consumer = consumer_factory()
+        await _consume_entries(consumer, entries)
+
+    await consumer.finish()
+    inventory_validators[url] = validators
+    return consumer
+
+
+async def _parse_inventory(url: str, stream: aiohttp.StreamReader) -> AsyncIterator[List[InventoryEntry]]:
+    """Parse an intersphinx inventory file from `stream`, yielding its entries in batches."""
+    inventory_header = (await stream.readline()).decode().rstrip()
+    inventory_version = int(inventory_header[-1:])
+    await stream.readline()  # skip project name
+    await stream.readline()  # skip project version
+
+    if inventory_version == 1:
+        loader = _load_v1(stream)
+
+    elif inventory_version == 2:
+        if b"zlib" not in await stream.readline():
             raise ValueError(f"Invalid inventory file at url {url}.")
+        loader = _load_v2(stream)
+
+    else:
+        raise ValueError(f"Invalid inventory file at url {url}.")
+
+    async for entries in loader:
+        yield entries
 
 
-async def fetch_inventory(url: str) -> Optional[InventoryDict]:
+def parse_inventory(url: str, data: Union[bytes, mmap.mmap]) -> List[InventoryEntry]:
     """
-    Get an inventory dict from `url`, retrying `FAILED_REQUEST_ATTEMPTS` times on errors.
-    `url` should point at a valid sphinx objects.inv inventory file, which will be parsed into the
-    inventory dict in the format of {"domain:role": [("symbol_name", "relative_url_to_symbol"), ...], ...}
+    Parse the whole content of the intersphinx inventory file from `url` into a list of its entries.
+    `data` can be any buffer with a `find` method, the compressed part of v2 inventories is decompressed
+    from it in chunks without copying it, so it can be a memory mapped file.
+    This doesn't need the event loop, so it can be ran in a process pool; the returned list is picklable.
     """
+    header_lines = []
+    position = 0
+    for _ in range(4):
+        end = data.find(b"\n", position)
+        if end == -1:
+            raise ValueError(f"Invalid inventory file at url {url}.")
+        header_lines.append(data[position:end])
+        position = end + 1
+    # The last line is only a header for v2 inventories
+    inventory_header, _project_name, _project_version, compression_header = header_lines
+    inventory_version = int(inventory_header.decode().rstrip()[-1:])
+
+    if inventory_version == 1:
+        return [_parse_v1_line(line) for line in (compression_header, *data[position:].splitlines())]
+
+    elif inventory_version == 2:
+        if b"zlib" not in compression_header:
+            raise ValueError(f"Invalid inventory file at url {url}.")
+        entries = []
+        with memoryview(data) as view:
+            for block in _decompress_line_blocks(view[position:]):
+                entries += _parse_v2_block(block)
+        return entries
+
+    raise ValueError(f"Invalid inventory file at url {url}.")
+
+
+def _parse_inventory_file(url: str, path: str) -> List[InventoryEntry]:
+    """Parse the intersphinx inventory file at `path` through a memory map of it."""
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return parse_inventory(url, mapped)
+
+
+async def _load_local_inventory(
+    url: str,
+    path: str,
+    consumer_factory: Callable[[], InventoryConsumer],
+    conditional: bool,
+    executor: Optional[Executor]
+) -> Union[InventoryConsumer, object]:
+    """
+    Parse the intersphinx inventory file at `path` in `executor`, or in the default executor if it's None.
+    The file's modification time and size are used as its validators for conditional loads.
+    """
+    stat = os.stat(path)
+    validators = (None, f"{stat.st_mtime_ns}-{stat.st_size}")
+    if conditional and inventory_validators.get(url) == validators:
+        return NOT_MODIFIED
+
+    entries = await asyncio.get_running_loop().run_in_executor(executor, _parse_inventory_file, url, path)
+    consumer = consumer_factory()
+    await _consume_entries(consumer, entries)
+    await consumer.finish()
+    inventory_validators[url] = validators
+    return consumer
+
+
+async def stream_inventory(
+    session: aiohttp.ClientSession,
+    url: str,
+    consumer_factory: Callable[[], ConsumerT],
+    *,
+    conditional: bool = False,
+    executor: Optional[Executor] = None
+) -> Union[ConsumerT, object, None]:
+    """
+    Parse the inventory at `url` into a consumer created by `consumer_factory`, trying up to `FAILED_REQUEST_ATTEMPTS` times.
+    `url` should point at a valid sphinx objects.inv inventory file, its entries are passed to the consumer
+    in batches as they're parsed, without the whole inventory being held in memory at once.
+    Every attempt creates a new consumer, and the consumer of the successful attempt is returned after it was finished.
+    If `conditional` is True and the inventory didn't change since it was last fetched, `NOT_MODIFIED` is returned;
+    it should only be set when the caller still holds the symbols from that previous fetch.
+    If `executor` is given, the downloaded inventory is parsed in it instead of on the event loop.
+
+    Attempts that fail with network errors or timeouts are spaced out as configured by `FETCH_BACKOFF`, and None is
+    returned if they all failed or if the host failed too often recently, see `HOST_CIRCUIT_BREAKER`.
+    `InvalidInventoryError` is raised without retrying if the inventory is missing or can't be parsed.
+
+    `url` can also be a `file://` url or an absolute filesystem path, the inventory is then read from the local file.
+    """
+    if (path := local_path(url)) is not None:
+        try:
+            return await _load_local_inventory(url, path, consumer_factory, conditional, executor)
+        except FileNotFoundError as e:
+            raise InvalidInventoryError(f"No inventory file found at {path}.") from e
+        except (ValueError, zlib.error) as e:
+            raise InvalidInventoryError(f"Invalid inventory file at url {url}.") from e
+        except OSError:
+            return None
+
+    host = urlsplit(url).netloc
+    if (breaker := _host_breakers.get(host)) is None:
+        breaker = _host_breakers[host] = CircuitBreaker(HOST_CIRCUIT_BREAKER.threshold, HOST_CIRCUIT_BREAKER.cooldown)
+
     for attempt in range(1, FAILED_REQUEST_ATTEMPTS + 1):
+        if breaker.is_open:
+            return None
+        if attempt > 1:
+            await asyncio.sleep(backoff_delay(attempt - 1, **vars(FETCH_BACKOFF)))
+
         try:
-            inventory = await _fetch_inventory(url)
-        except Exception:
-            pass
+            consumer = await _fetch_inventory(session, url, consumer_factory, conditional, executor)
+        except aiohttp.ClientResponseError as e:
+            if 400 <= e.status < 500 and e.status not in RETRYABLE_STATUSES:
+                breaker.record_success()
+                raise InvalidInventoryError(f"HTTP GET on {url} returned status {e.status}.") from e
+            breaker.record_failure()
+        except (ValueError, zlib.error) as e:
+            # The host responded fine, the file just isn't a valid inventory.
+            breaker.record_success()
+            raise InvalidInventoryError(f"Invalid inventory file at url {url}.") from e
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            # Anything else isn't the host's fault, and is raised to the caller.
+            breaker.record_failure()
         else:
-            return inventory
+            breaker.record_success()
+            return consumer
 
     return None
+
+
+async def fetch_inventory(
+    session: aiohttp.ClientSession,
+    url: str,
+    *,
+    conditional: bool = False,
+    executor: Optional[Executor] = None
+) -> Union[InventoryDict, object, None]:
+    """
+    Get an inventory dict from `url` through `session`, like `stream_inventory`.
+    The inventory is collected into an inventory dict in the format of
+    {"domain:role": [("symbol_name", "relative_url_to_symbol"), ...], ...}
+    """
+    collector = await stream_inventory(session, url, _InventoryCollector, conditional=conditional, executor=executor)
+    if isinstance(collector, _InventoryCollector):
+        return collector.inventory
+    return collector
@@ -1,4 +1,4 @@
-from typing import Any, Dict, Optional, List
+from typing import Any, Awaitable, Callable, Dict, Optional, List, Union
 import asyncio
 
 import disnake
@@ -7,12 +7,15 @@ from disnake.ext import commands
 
 from . import menus
 
+# A page is either a built embed or a coroutine function that builds it the first time the page is shown.
+EmbedPage = Union[disnake.Embed, Callable[[], Awaitable[disnake.Embed]]]
+
 
 class EmbedPaginator(disnake.ui.View):
     def __init__(
         self,
         ctx,
-        embeds: List[disnake.Embed],
+        embeds: List[EmbedPage],
         *,
         timeout: float = 180.0
     ):
@@ -20,6 +23,7 @@ class EmbedPaginator(disnake.ui.View):
         self.ctx = ctx
         self.embeds = embeds
         self.current_page = 0
+        self._renders: Dict[int, asyncio.Future] = {}
 
     async def interaction_check(self, interaction: MessageInteraction) -> bool:
         if interaction.user and interaction.user.id in (self.ctx.bot.owner_id, self.ctx.author.id):
@@ -31,6 +35,22 @@ class EmbedPaginator(disnake.ui.View):
         if self.message:
             await self.message.edit(view=None)
 
+    async def get_page(self, page_number: int) -> disnake.Embed:
+        """Return the embed of `page_number`, building it first if it's a coroutine function."""
+
+        page = self.embeds[page_number]
+        if isinstance(page, disnake.Embed):
+            return page
+        # Presses that arrive while the page is being built wait for the same build.
+        if (render := self._renders.get(page_number)) is None:
+            render = self._renders[page_number] = asyncio.ensure_future(page())
+        try:
+            embed = self.embeds[page_number] = await render
+        finally:
+            # A failed build is attempted again on the next press instead of raising its error again.
+            self._renders.pop(page_number, None)
+        return embed
+
     async def show_page(self, inter: MessageInteraction, page_number: int):
         if (
             (page_number < 0) or
@@ -38,7 +58,10 @@ class EmbedPaginator(disnake.ui.View):
         ):
             return
         self.current_page = page_number
-        embed = self.embeds[page_number]
+        if not isinstance(self.embeds[page_number], disnake.Embed) and not inter.response.is_done():
+            # Building the page may take longer than Discord waits for a response.
+            await inter.response.defer()
+        embed = await self.get_page(page_number)
         embed.set_footer(text=f'Page {self.current_page + 1}/{len(self.embeds)}')
         if inter.response.is_done():
             await self.message.edit(embed=embed)
@@ -79,7 +102,7 @@ class EmbedPaginator(disnake.ui.View):
     async def start(self):
         """Start paginating over the embeds."""
 
-        embed = self.embeds[0]
+        embed = await self.get_page(0)
         embed.set_footer(text=f'Page 1/{len(self.embeds)}')
         self.message = await self.ctx.send(embed=embed, view=self)
 
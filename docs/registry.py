@@ -0,0 +1,352 @@
+from __future__ import annotations
+
+import sys
+from array import array
+from collections import defaultdict
+from copy import copy
+from collections.abc import Mapping
+from typing import Dict, ItemsView, Iterator, KeysView, List, NamedTuple, Optional
+
+# Stored instead of a symbol id's length when the id is equal to the symbol's inventory name,
+# which is the case for most symbols of the Python domain.
+_SAME_AS_NAME = 0xFFFFFFFF
+_ROW_BITS = 32
+_ROW_MASK = (1 << _ROW_BITS) - 1
+
+
+class DocItem(NamedTuple):
+    """Holds inventory symbol information."""
+
+    package: str  # Name of the package name the symbol is from
+    group: str  # Interpshinx "role" of the symbol, for example `label` or `method`
+    base_url: str  # Absolute path to to which the relative path resolves, same for all items with the same package
+    relative_url_path: str  # Relative path to the page where the symbol is located
+    symbol_id: str  # Fragment id used to locate the symbol on the page
+
+    @property
+    def url(self) -> str:
+        """Return the absolute url to the symbol."""
+        return self.base_url + self.relative_url_path
+
+
+class _PackageTable:
+    """
+    The symbols of a single package, stored in columns indexed by row.
+    Groups and pages are stored once in the table and referenced by index, symbol ids are packed into one buffer.
+    Rows of removed symbols are reused, and the buffer is compacted once most of it is taken up by removed ids.
+    The rows of every page are also kept, so the symbols on a page are found without scanning the table.
+    """
+
+    __slots__ = (
+        "package", "base_url", "groups", "group_indices", "pages", "page_indices", "page_rows",
+        "names", "group_column", "page_column", "id_offsets", "id_lengths", "id_data", "id_garbage", "free_rows",
+    )
+
+    def __init__(self, package: str, base_url: str):
+        self.package = package
+        self.base_url = base_url
+        self.groups: List[str] = []
+        self.group_indices: Dict[str, int] = {}
+        self.pages: List[str] = []
+        self.page_indices: Dict[str, int] = {}
+        self.page_rows: List[array] = []
+
+        self.names: List[Optional[str]] = []  # None for free rows
+        self.group_column = array("H")
+        self.page_column = array("I")
+        self.id_offsets = array("I")
+        self.id_lengths = array("I")
+        self.id_data = bytearray()
+        self.id_garbage = 0
+        self.free_rows: List[int] = []
+
+    def add(self, symbol_name: str, doc_item: DocItem, inventory_name: str) -> int:
+        """Store the fields of `doc_item` in a free row and return it."""
+        if (group_index := self.group_indices.get(doc_item.group)) is None:
+            group_index = self.group_indices[doc_item.group] = len(self.groups)
+            self.groups.append(sys.intern(doc_item.group))
+        if (page_index := self.page_indices.get(doc_item.relative_url_path)) is None:
+            page_index = self.page_indices[doc_item.relative_url_path] = len(self.pages)
+            self.pages.append(sys.intern(doc_item.relative_url_path))
+            self.page_rows.append(array("I"))
+
+        if doc_item.symbol_id == inventory_name:
+            id_offset, id_length = 0, _SAME_AS_NAME
+        else:
+            encoded_id = doc_item.symbol_id.encode()
+            id_offset, id_length = len(self.id_data), len(encoded_id)
+            self.id_data += encoded_id
+
+        if self.free_rows:
+            row = self.free_rows.pop()
+            self.names[row] = symbol_name
+            self.group_column[row] = group_index
+            self.page_column[row] = page_index
+            self.id_offsets[row] = id_offset
+            self.id_lengths[row] = id_length
+        else:
+            row = len(self.names)
+            self.names.append(symbol_name)
+            self.group_column.append(group_index)
+            self.page_column.append(page_index)
+            self.id_offsets.append(id_offset)
+            self.id_lengths.append(id_length)
+        self.page_rows[page_index].append(row)
+        return row
+
+    def remove(self, row: int) -> None:
+        """Free `row`."""
+        self.names[row] = None
+        self.page_rows[self.page_column[row]].remove(row)
+        if (id_length := self.id_lengths[row]) != _SAME_AS_NAME:
+            self.id_garbage += id_length
+            if self.id_garbage > len(self.id_data) // 2:
+                self._compact_ids()
+        self.free_rows.append(row)
+
+    def _compact_ids(self) -> None:
+        """Rebuild the symbol id buffer from the ids of the stored symbols only."""
+        id_data = bytearray()
+        for row in self.rows():
+            if (id_length := self.id_lengths[row]) != _SAME_AS_NAME:
+                id_offset = self.id_offsets[row]
+                self.id_offsets[row] = len(id_data)
+                id_data += self.id_data[id_offset:id_offset + id_length]
+        self.id_data = id_data
+        self.id_garbage = 0
+
+    def item(self, row: int, inventory_name: str) -> DocItem:
+        """Materialize the `DocItem` stored in `row`."""
+        if (id_length := self.id_lengths[row]) == _SAME_AS_NAME:
+            symbol_id = inventory_name
+        else:
+            id_offset = self.id_offsets[row]
+            symbol_id = self.id_data[id_offset:id_offset + id_length].decode()
+        return DocItem(
+            self.package,
+            self.groups[self.group_column[row]],
+            self.base_url,
+            self.pages[self.page_column[row]],
+            symbol_id,
+        )
+
+    def rows(self) -> Iterator[int]:
+        """Yield the rows that hold a symbol."""
+        return (row for row, symbol_name in enumerate(self.names) if symbol_name is not None)
+
+    def copy(self) -> _PackageTable:
+        """Return a copy of the table that can be modified independently of it."""
+        table = _PackageTable(self.package, self.base_url)
+        for slot in self.__slots__:
+            setattr(table, slot, copy(getattr(self, slot)))
+        table.page_rows = [copy(rows) for rows in self.page_rows]
+        return table
+
+
+def _last_segment(symbol_name: str) -> str:
+    """Return the case-folded part of `symbol_name` after its last dot."""
+    return symbol_name.rpartition(".")[2].casefold()
+
+
+class SymbolRegistry(Mapping):
+    """
+    Maps symbol names to the `DocItem`s they refer to.
+    The symbols are stored in a columnar table per package, see `_PackageTable`, and `DocItem`s are only
+    materialized when a symbol is looked up; the mapping itself only holds the table and row of every symbol.
+    Besides the mapping, the registry keeps track of the names the symbols had in their inventory when they were
+    renamed to avoid conflicts, so that a package's symbols can be compared against a new version of its inventory.
+    It also indexes the symbols by the last segment of their dotted name, so short names like `Embed` are found directly.
+    """
+
+    def __init__(self):
+        self._symbols: Dict[str, int] = {}  # Maps symbol names to their table index and row packed into one int.
+        self._tables: List[Optional[_PackageTable]] = []  # Tables of removed packages are set to None.
+        self._table_indices: Dict[str, int] = {}
+        # Only holds the symbols whose name differs from the one in their inventory.
+        self._inventory_names: Dict[str, str] = {}
+        # Maps case-folded last segments to the names ending with them.
+        self._segments: Dict[str, List[str]] = defaultdict(list)
+        # Incremented on every rename, so holders of symbol names can tell when theirs may be outdated.
+        self.rename_count = 0
+        # Incremented on every change, so holders of the registry can tell whether it changed at all.
+        self.mutation_count = 0
+
+    def _item(self, symbol_name: str, location: int) -> DocItem:
+        table = self._tables[location >> _ROW_BITS]
+        return table.item(location & _ROW_MASK, self._inventory_names.get(symbol_name, symbol_name))
+
+    def __getitem__(self, symbol_name: str) -> DocItem:
+        return self._item(symbol_name, self._symbols[symbol_name])
+
+    def __contains__(self, symbol_name: object) -> bool:
+        return symbol_name in self._symbols
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._symbols)
+
+    def __len__(self) -> int:
+        return len(self._symbols)
+
+    def _add_segment(self, symbol_name: str) -> None:
+        self._segments[_last_segment(symbol_name)].append(symbol_name)
+
+    def _remove_segment(self, symbol_name: str) -> None:
+        segment = _last_segment(symbol_name)
+        symbol_names = self._segments[segment]
+        symbol_names.remove(symbol_name)
+        if not symbol_names:
+            del self._segments[segment]
+
+    def get(self, symbol_name: str, default: Optional[DocItem] = None) -> Optional[DocItem]:
+        if (location := self._symbols.get(symbol_name)) is None:
+            return default
+        return self._item(symbol_name, location)
+
+    def keys(self) -> KeysView[str]:
+        return self._symbols.keys()
+
+    def items(self) -> ItemsView[str, DocItem]:
+        """Return a view of the symbols and their items, the items are materialized while it's iterated over."""
+        return ItemsView(self)
+
+    def add(self, symbol_name: str, doc_item: DocItem, inventory_name: Optional[str] = None) -> None:
+        """
+        Store `doc_item` under `symbol_name`, replacing the item currently stored under it.
+        `inventory_name` is the name of the symbol in its inventory, if it differs from `symbol_name`.
+        The base url of all symbols from the item's package is set to the item's base url.
+        """
+        if symbol_name in self._symbols:
+            self.remove(symbol_name)
+
+        if (table_index := self._table_indices.get(doc_item.package)) is None:
+            table_index = self._table_indices[doc_item.package] = len(self._tables)
+            self._tables.append(_PackageTable(doc_item.package, doc_item.base_url))
+        table = self._tables[table_index]
+        table.base_url = doc_item.base_url
+
+        if inventory_name is not None and inventory_name != symbol_name:
+            self._inventory_names[symbol_name] = inventory_name
+        else:
+            inventory_name = symbol_name
+        row = table.add(symbol_name, doc_item, inventory_name)
+        self._symbols[symbol_name] = table_index << _ROW_BITS | row
+        self._add_segment(symbol_name)
+        self.mutation_count += 1
+
+    def remove(self, symbol_name: str) -> DocItem:
+        """Remove the symbol stored under `symbol_name` and return its item."""
+        location = self._symbols.pop(symbol_name)
+        doc_item = self._item(symbol_name, location)
+        self._tables[location >> _ROW_BITS].remove(location & _ROW_MASK)
+        self._inventory_names.pop(symbol_name, None)
+        self._remove_segment(symbol_name)
+        self.mutation_count += 1
+        return doc_item
+
+    def remove_package(self, package_name: str) -> int:
+        """Remove all symbols from `package_name` along with its table, return the number of removed symbols."""
+        if (table_index := self._table_indices.pop(package_name, None)) is None:
+            return 0
+        table = self._tables[table_index]
+        self._tables[table_index] = None
+
+        symbol_names = [table.names[row] for row in table.rows()]
+        for symbol_name in symbol_names:
+            del self._symbols[symbol_name]
+            self._inventory_names.pop(symbol_name, None)
+            self._remove_segment(symbol_name)
+        self.mutation_count += 1
+        return len(symbol_names)
+
+    def rename(self, symbol_name: str, new_name: str) -> None:
+        """Move the symbol stored under `symbol_name` to `new_name`, keeping track of its inventory name."""
+        inventory_name = self.inventory_name(symbol_name)
+        if new_name in self._symbols:
+            self.remove(new_name)
+        location = self._symbols[new_name] = self._symbols.pop(symbol_name)
+        self._tables[location >> _ROW_BITS].names[location & _ROW_MASK] = new_name
+        self._remove_segment(symbol_name)
+        self._add_segment(new_name)
+
+        self._inventory_names.pop(symbol_name, None)
+        if inventory_name != new_name:
+            self._inventory_names[new_name] = inventory_name
+        self.rename_count += 1
+        self.mutation_count += 1
+
+    def inventory_name(self, symbol_name: str) -> str:
+        """Return the name the symbol stored under `symbol_name` has in its inventory."""
+        return self._inventory_names.get(symbol_name, symbol_name)
+
+    def symbol_row(self, symbol_name: str) -> int:
+        """Return the row of the symbol stored under `symbol_name` in its package's table, rows are reused after removals."""
+        return self._symbols[symbol_name] & _ROW_MASK
+
+    def symbol_package(self, symbol_name: str) -> str:
+        """Return the package of the symbol stored under `symbol_name`, without materializing its item."""
+        return self._tables[self._symbols[symbol_name] >> _ROW_BITS].package
+
+    def packages(self) -> List[str]:
+        """Return the names of the packages that have symbols stored."""
+        return list(self._table_indices)
+
+    def segment_symbols(self, segment: str) -> List[str]:
+        """Return the names of the symbols whose last dotted segment is `segment`, ignoring case."""
+        return list(self._segments.get(segment.casefold(), ()))
+
+    def casefold_symbols(self, symbol_name: str) -> List[str]:
+        """Return the names of the symbols that are equal to `symbol_name` when ignoring case, from the segment index."""
+        folded_name = symbol_name.casefold()
+        return [name for name in self._segments.get(_last_segment(symbol_name), ()) if name.casefold() == folded_name]
+
+    def package_symbols(self, package_name: str) -> List[str]:
+        """Return the names of all symbols from `package_name`."""
+        if (table_index := self._table_indices.get(package_name)) is None:
+            return []
+        table = self._tables[table_index]
+        return [table.names[row] for row in table.rows()]
+
+    def package_groups(self, package_name: str) -> Dict[str, Dict[str, str]]:
+        """Return the names of the symbols from `package_name` by their group and by their inventory name."""
+        groups = defaultdict(dict)
+        if (table_index := self._table_indices.get(package_name)) is None:
+            return groups
+
+        table = self._tables[table_index]
+        inventory_names = self._inventory_names
+        for row in table.rows():
+            symbol_name = table.names[row]
+            groups[table.groups[table.group_column[row]]][inventory_names.get(symbol_name, symbol_name)] = symbol_name
+        return groups
+
+    def page_items(self, doc_item: DocItem) -> List[DocItem]:
+        """Return the items of all symbols from the package of `doc_item` that are on the same page."""
+        if (table_index := self._table_indices.get(doc_item.package)) is None:
+            return []
+        table = self._tables[table_index]
+        if (page_index := table.page_indices.get(doc_item.relative_url_path)) is None:
+            return []
+
+        inventory_names = self._inventory_names
+        return [table.item(row, inventory_names.get(table.names[row], table.names[row])) for row in table.page_rows[page_index]]
+
+    def copy(self) -> SymbolRegistry:
+        """Return a copy of the registry that can be modified independently of it."""
+        registry = SymbolRegistry()
+        registry._symbols = self._symbols.copy()
+        registry._tables = [table and table.copy() for table in self._tables]
+        registry._table_indices = self._table_indices.copy()
+        registry._inventory_names = self._inventory_names.copy()
+        registry._segments = defaultdict(list, {segment: names.copy() for segment, names in self._segments.items()})
+        registry.rename_count = self.rename_count
+        registry.mutation_count = self.mutation_count
+        return registry
+
+    def clear(self) -> None:
+        """Remove all symbols."""
+        self._symbols.clear()
+        self._tables.clear()
+        self._table_indices.clear()
+        self._inventory_names.clear()
+        self._segments.clear()
+        self.mutation_count += 1
@@ -0,0 +1,494 @@
+from __future__ import annotations
+
+import heapq
+import re
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple, Union
+
+from .utils import finder
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# `VectorScorer` can only be used if NumPy is installed, which is optional.
+HAS_NUMPY = np is not None
+
+# Number of consecutive names sharing an entry in the trigram postings.
+BLOCK_SIZE = 256
+# Max number of corrections of a single dotted segment that are combined into corrected queries.
+_SEGMENT_CORRECTIONS = 5
+# Max number of dotted segments of a query that are corrected, queries with more unknown segments aren't corrected.
+_CORRECTED_SEGMENTS = 3
+# Upper bounds of the name length buckets `VectorScorer` matches names in, so rows are padded to at most twice their length.
+_WIDTH_BUCKETS = (16, 32, 64, 128)
+# Bits of an autocomplete key holding the offset of the segment the key starts at within its name.
+_OFFSET_BITS = 16
+_OFFSET_MASK = (1 << _OFFSET_BITS) - 1
+
+_Match = Tuple[int, int, str]
+Candidates = Union[range, List[str]]
+
+
+def _subsequence_pattern(text: str) -> re.Pattern:
+    """
+    Compile a pattern matching the characters of `text` in order, within a single line.
+    Each character is matched at its first occurrence after the previous one, which finds the same match as
+    `finder`'s lazy pattern at every start, without any backtracking.
+    """
+    parts = [re.escape(text[0])]
+    for char in text[1:]:
+        escaped = re.escape(char)
+        parts.append(f"[^{escaped}\\n]*{escaped}")
+    return re.compile("".join(parts))
+
+
+class _PackageNames:
+    """
+    Symbol names grouped by their package, with the ASCII names in `names` and the rest kept separately,
+    as lowercasing names with other characters doesn't always agree with case insensitive matching.
+    The ASCII names of every package are contiguous, so a search can be limited to a package by their rows.
+    """
+
+    def __init__(self, package_symbols: Mapping[str, Iterable[str]]):
+        self.names: List[str] = []
+        self._package_rows: Dict[str, range] = {}
+        self._other_names: Dict[str, List[str]] = {}
+        for package, symbol_names in package_symbols.items():
+            start = len(self.names)
+            other_names = self._other_names[package] = []
+            for name in symbol_names:
+                (self.names if name.isascii() else other_names).append(name)
+            self._package_rows[package] = range(start, len(self.names))
+
+    def _scope(self, package: Optional[str]) -> Tuple[range, List[str]]:
+        """Return the rows of the ASCII names and the other names to search, of all packages if `package` is None."""
+        if package is None:
+            return range(len(self.names)), [name for names in self._other_names.values() for name in names]
+        return self._package_rows.get(package, range(0)), self._other_names.get(package, [])
+
+    def _finder(self, text: str, limit: Optional[int], package: Optional[str]) -> List[str]:
+        """Match the names of `package` with `finder`, for queries the subclass can't handle itself."""
+        rows, other_names = self._scope(package)
+        return finder(text, (*self.names[rows.start:rows.stop], *other_names), lazy=False, k=limit)
+
+
+def _other_matches(text: str, other_names: List[str]) -> List[_Match]:
+    """Score the names with non-ASCII characters with `finder`'s pattern."""
+    pattern = re.compile('.*?'.join(map(re.escape, text)), flags=re.IGNORECASE)
+    return sorted((len(match.group()), match.start(), name) for name in other_names if (match := pattern.search(name)))
+
+
+class SearchIndex(_PackageNames):
+    """
+    A trigram index over symbol names that ranks the names like `utils.finder`, without scanning all of them.
+    The ASCII names are lowercased and joined into one string, and split into blocks of up to `BLOCK_SIZE` names
+    for which the trigrams they contain are stored. Blocks never span two packages, so searches can be limited to one.
+    A name that matches a query with its characters spread over `n` gaps still contains all but at most `2n`
+    of the query's trigrams, so blocks are scanned in order of the gaps their names could have,
+    until the best results can't be beaten by the names in the blocks that weren't scanned.
+    Names with non-ASCII characters are always scored with `finder`'s pattern.
+    """
+
+    def __init__(self, package_symbols: Mapping[str, Iterable[str]]):
+        super().__init__(package_symbols)
+        self._text = "\n".join(self.names).lower()
+        self._offsets = array("I")
+        position = 0
+        for name in self.names:
+            self._offsets.append(position)
+            position += len(name) + 1
+        self._offsets.append(position)
+
+        self._block_bounds = []
+        self._package_blocks: Dict[str, range] = {}
+        for package, rows in self._package_rows.items():
+            first_block = len(self._block_bounds)
+            self._block_bounds.extend(self._offsets[row] for row in range(rows.start, rows.stop, BLOCK_SIZE))
+            self._package_blocks[package] = range(first_block, len(self._block_bounds))
+        self._block_bounds.append(position)
+
+        self._postings: Dict[Tuple[str, str, str], array] = {}
+        for block, (start, end) in enumerate(zip(self._block_bounds, self._block_bounds[1:])):
+            text = self._text[start:end]
+            for trigram in set(zip(text, text[1:], text[2:])):
+                if (blocks := self._postings.get(trigram)) is None:
+                    blocks = self._postings[trigram] = array("H")
+                blocks.append(block)
+
+    def _scan_block(self, pattern: re.Pattern, block: int, matches: List[_Match]) -> None:
+        """Add the first match of every name in `block`, scored like `finder` does."""
+        position, end = self._block_bounds[block], self._block_bounds[block + 1]
+        offsets = self._offsets
+        while (match := pattern.search(self._text, position, end)) is not None:
+            start = match.start()
+            index = bisect_right(offsets, start) - 1
+            matches.append((match.end() - start, start - offsets[index], self.names[index]))
+            position = offsets[index + 1]
+
+    def search(self, text: str, limit: int, package: Optional[str] = None) -> List[str]:
+        """
+        Return the same names as `finder(text, names, lazy=False, k=limit)`.
+        If `package` is given, only the names of that package are searched.
+        """
+        text = str(text)
+        if not text or not text.isascii() or "\n" in text:
+            return self._finder(text, limit, package)
+
+        _rows, other_names = self._scope(package)
+        matches = _other_matches(text, other_names)
+
+        query = text.lower()
+        pattern = _subsequence_pattern(query)
+        trigrams = set(zip(query, query[1:], query[2:]))
+        block_counts: Dict[int, int] = {}
+        for trigram in trigrams:
+            for block in self._postings.get(trigram, ()):
+                block_counts[block] = block_counts.get(block, 0) + 1
+
+        unscanned = set(self._package_blocks.get(package, ())) if package is not None else set(range(len(self._block_bounds) - 1))
+        gaps = 0
+        while unscanned:
+            required = len(trigrams) - 2 * gaps
+            if required > 0:
+                blocks = [block for block, count in block_counts.items() if count >= required and block in unscanned]
+            else:
+                blocks = list(unscanned)
+            for block in blocks:
+                self._scan_block(pattern, block, matches)
+            unscanned.difference_update(blocks)
+
+            # The names that weren't scanned have more gaps, so their matches are longer than `len(query) + gaps`.
+            if sum(length <= len(query) + gaps for length, _, _ in matches) >= limit:
+                break
+            gaps += 1
+
+        return [name for _, _, name in heapq.nsmallest(limit, matches)]
+
+
+class VectorScorer(_PackageNames):
+    """
+    Scores symbol names like `utils.finder` with NumPy operations over all names at once, requires NumPy.
+    The ASCII names are lowercased and packed into one byte array with the offset and length of every name.
+    A query is matched by first dropping the names that lack any of its characters, using a bitmask
+    of the characters in every name, then gathering the rest into a padded matrix per length bucket,
+    and finding the next occurrence of each query character in every row.
+    Names with non-ASCII characters are scored with `finder`'s pattern and merged into the results.
+    """
+
+    def __init__(self, package_symbols: Mapping[str, Iterable[str]]):
+        if np is None:
+            raise RuntimeError("VectorScorer requires NumPy to be installed.")
+        super().__init__(package_symbols)
+        self._lengths = np.fromiter(map(len, self.names), dtype=np.int64, count=len(self.names))
+        self._starts = np.zeros(len(self.names), dtype=np.int64)
+        np.cumsum(self._lengths[:-1] + 1, out=self._starts[1:])
+        self._text = np.frombuffer("\n".join(self.names).lower().encode("ascii"), dtype=np.uint8)
+        if self.names:
+            char_bits = np.left_shift(np.uint64(1), (self._text % 64).astype(np.uint64))
+            self._char_masks = np.bitwise_or.reduceat(char_bits, self._starts)
+        else:
+            self._char_masks = np.zeros(0, dtype=np.uint64)
+        # Position of every name when sorted, to break ties the same way sorting the names themselves would.
+        self._ranks = np.empty(len(self.names), dtype=np.int64)
+        self._ranks[sorted(range(len(self.names)), key=self.names.__getitem__)] = np.arange(len(self.names))
+
+    def _match_rows(self, query: bytes, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Match `query` against the names at `indices`, return the indices that matched, and their match starts and ends."""
+        if not len(indices):
+            return indices, indices, indices
+        lengths = self._lengths[indices]
+        columns = np.arange(int(lengths.max()))
+        rows = self._text[np.minimum(self._starts[indices, None] + columns, len(self._text) - 1)]
+        rows[columns >= lengths[:, None]] = 0
+
+        starts = positions = np.zeros(len(indices), dtype=np.int64)
+        for query_index, char in enumerate(query):
+            hits = (rows == char) & (columns >= positions[:, None])
+            next_hits = hits.argmax(axis=1)
+            found = hits[np.arange(len(next_hits)), next_hits]
+            indices, rows, next_hits = indices[found], rows[found], next_hits[found]
+            starts = next_hits if query_index == 0 else starts[found]
+            positions = next_hits + 1
+        return indices, starts, positions
+
+    def find(self, text: str, limit: Optional[int] = None, package: Optional[str] = None) -> List[str]:
+        """
+        Return the same names as `finder(text, names, lazy=False, k=limit)`.
+        If `package` is given, only the names of that package are searched.
+        """
+        text = str(text)
+        if not text or not text.isascii() or "\n" in text:
+            return self._finder(text, limit, package)
+
+        rows, other_names = self._scope(package)
+        query = text.lower().encode("ascii")
+        query_mask = np.uint64(0)
+        for char in query:
+            query_mask |= np.uint64(1 << (char % 64))
+        candidates = np.flatnonzero((self._char_masks[rows.start:rows.stop] & query_mask) == query_mask) + rows.start
+        buckets = np.searchsorted(np.array(_WIDTH_BUCKETS), self._lengths[candidates])
+        parts = [self._match_rows(query, candidates[buckets == bucket]) for bucket in range(len(_WIDTH_BUCKETS) + 1)]
+        indices, starts, ends = (np.concatenate(columns) for columns in zip(*parts))
+        order = np.lexsort((self._ranks[indices], starts, ends - starts))[:limit]
+
+        other_matches = _other_matches(text, other_names)
+        if not other_matches:
+            return [self.names[index] for index in indices[order].tolist()]
+
+        matches = zip((ends - starts)[order].tolist(), starts[order].tolist(), (self.names[index] for index in indices[order].tolist()))
+        return [name for _, _, name in islice(heapq.merge(matches, other_matches), limit)]
+
+
+def _char_masks(pattern: str) -> Dict[str, int]:
+    """Map every character of `pattern` to a bitmask of the positions it's at."""
+    masks: Dict[str, int] = {}
+    for index, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | 1 << index
+    return masks
+
+
+def _edit_distance(pattern: str, masks: Dict[str, int], text: str, *, transpositions: bool = False) -> int:
+    """
+    Return the Levenshtein distance between `pattern` and `text`, `masks` has to be `_char_masks(pattern)`.
+    It's computed with Myers' bit-parallel algorithm, one step per character of `text`.
+    If `transpositions` is True, swapping two adjacent characters counts as a single edit,
+    which gives the optimal string alignment distance using Hyyrö's extension of the algorithm.
+    """
+    if not pattern:
+        return len(text)
+    all_bits = (1 << len(pattern)) - 1
+    last_bit = 1 << len(pattern) - 1
+    vertical_positive, vertical_negative, diagonal_zero, previous_mask = all_bits, 0, 0, 0
+    distance = len(pattern)
+    for char in text:
+        mask = masks.get(char, 0)
+        # Positions where the previous and current characters of `text` match the pattern the other way round.
+        transposed = ((~diagonal_zero & mask) << 1) & previous_mask if transpositions else 0
+        diagonal_zero = (((mask & vertical_positive) + vertical_positive) ^ vertical_positive) | mask | vertical_negative | transposed
+        previous_mask = mask
+        horizontal_positive = vertical_negative | (~(diagonal_zero | vertical_positive) & all_bits)
+        horizontal_negative = diagonal_zero & vertical_positive
+        if horizontal_positive & last_bit:
+            distance += 1
+        elif horizontal_negative & last_bit:
+            distance -= 1
+        horizontal_positive = (horizontal_positive << 1 | 1) & all_bits
+        horizontal_negative = (horizontal_negative << 1) & all_bits
+        vertical_positive = horizontal_negative | (~(diagonal_zero | horizontal_positive) & all_bits)
+        vertical_negative = horizontal_positive & diagonal_zero
+    return distance
+
+
+class TypoIndex:
+    """
+    A BK-tree over the case-folded dotted segments of symbol names, to correct typos in queries.
+    Every node's children are keyed by their distance to it, so by the triangle inequality only the children
+    within `max_distance` of the query's distance to the node can hold matches.
+    The tree is built on the Levenshtein distance, as it needs a metric, but corrections are ranked by
+    the optimal string alignment distance, so that two swapped characters count as a single typo.
+    """
+
+    def __init__(self, symbol_names: Iterable[str]):
+        self._segments = set()
+        # Corrections must end with one of these, as only those resolve to symbols.
+        self._last_segments = set()
+        for name in symbol_names:
+            segments = name.casefold().split(".")
+            self._segments.update(segments)
+            self._last_segments.add(segments[-1])
+        self._words: List[str] = []
+        self._children: List[Dict[int, int]] = []
+        for segment in self._segments:
+            self._insert(segment)
+
+    def _insert(self, word: str) -> None:
+        self._words.append(word)
+        self._children.append({})
+        if len(self._words) == 1:
+            return
+        masks = _char_masks(word)
+        node = 0
+        while True:
+            distance = _edit_distance(word, masks, self._words[node])
+            if (child := self._children[node].get(distance)) is None:
+                self._children[node][distance] = len(self._words) - 1
+                return
+            node = child
+
+    def segment_corrections(self, segment: str, max_distance: int) -> List[Tuple[int, str]]:
+        """
+        Return the segments within `max_distance` edits of `segment` with their distance, closest first.
+        The tree is searched one Levenshtein edit further, so corrections that include a transposition,
+        which takes two Levenshtein edits, are found as well.
+        """
+        if not self._words:
+            return []
+        masks = _char_masks(segment)
+        radius = max_distance + 1
+        found = []
+        nodes = [0]
+        while nodes:
+            node = nodes.pop()
+            word = self._words[node]
+            distance = _edit_distance(segment, masks, word)
+            if distance <= radius and (alignment_distance := _edit_distance(segment, masks, word, transpositions=True)) <= max_distance:
+                found.append((alignment_distance, word))
+            nodes.extend(
+                child for child_distance, child in self._children[node].items()
+                if distance - radius <= child_distance <= distance + radius
+            )
+        return sorted(found)
+
+    def corrections(self, text: str, limit: int = 10) -> List[Tuple[int, str]]:
+        """
+        Return up to `limit` corrections of the dotted name `text` with their total distance, closest first.
+        Only segments that aren't a segment of any symbol are corrected, by up to one edit if they have
+        up to 5 characters and two if they're longer; shorter segments are never corrected.
+        The last segment is also corrected if no symbol name ends with it, and at most `_CORRECTED_SEGMENTS`
+        segments are corrected. Only the best `limit` corrections of the segments so far are extended
+        with the corrections of the next one.
+        """
+        segments = str(text).casefold().split(".")
+        known_segments = [self._segments] * (len(segments) - 1) + [self._last_segments]
+        if sum(segment not in known for segment, known in zip(segments, known_segments)) > _CORRECTED_SEGMENTS:
+            return []
+
+        # Holds one more than `limit`, the query itself is dropped from it at the end if it's a known name.
+        corrections = [(0, "")]
+        for index, (segment, known) in enumerate(zip(segments, known_segments)):
+            if segment in known:
+                options = [(0, segment)]
+            else:
+                max_distance = 0 if len(segment) < 3 else 1 if len(segment) <= 5 else 2
+                options = [option for option in self.segment_corrections(segment, max_distance) if option[1] in known]
+                if not options:
+                    return []
+            corrections = heapq.nsmallest(
+                limit + 1,
+                (
+                    (distance + option_distance, f"{correction}.{option}" if index else option)
+                    for distance, correction in corrections
+                    for option_distance, option in options[:_SEGMENT_CORRECTIONS]
+                ),
+            )
+        return [correction for correction in corrections if correction[0]][:limit]
+
+
+def match_span(text: str, name: str) -> Optional[int]:
+    """Return the length of `finder`'s match of `text` in `name`, None if it doesn't match."""
+    match = re.search('.*?'.join(map(re.escape, str(text))), name, flags=re.IGNORECASE)
+    return len(match.group()) if match else None
+
+
+class _SegmentKeys(Sequence):
+    """The case-folded suffixes an `AutocompleteIndex` is sorted by, so they can be bisected without storing them."""
+
+    def __init__(self, names: List[str], keys: array):
+        self._names = names
+        self._keys = keys
+
+    def __getitem__(self, index: int) -> str:
+        key = self._keys[index]
+        return self._names[key >> _OFFSET_BITS][key & _OFFSET_MASK:].casefold()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+class AutocompleteIndex:
+    """
+    A sorted index of symbol names for autocompletion, matching queries against the start of a name
+    or the start of any of its dotted segments, ignoring case.
+    Every name has one key per segment, holding the name's index and the offset the segment starts at.
+    The keys are sorted by the case-folded rest of the name from that offset, so matches for a query are
+    found by bisecting to the first key starting with it.
+    """
+
+    def __init__(self, names: Iterable[str]):
+        self.names = list(names)
+        keys = []
+        for index, name in enumerate(self.names):
+            if len(name) > _OFFSET_MASK:
+                continue
+            keys.append(index << _OFFSET_BITS)
+            offset = name.find(".")
+            while offset != -1:
+                keys.append(index << _OFFSET_BITS | offset + 1)
+                offset = name.find(".", offset + 1)
+        keys.sort(key=lambda key: self.names[key >> _OFFSET_BITS][key & _OFFSET_MASK:].casefold())
+        self._keys = array("Q", keys)
+        self._segments = _SegmentKeys(self.names, self._keys)
+
+    def key_range(self, text: str, within: Optional[range] = None) -> range:
+        """
+        Return the positions of the keys starting with `text`, ignoring case.
+        If `within` is given, only those positions are searched; pass the range of a prefix of `text` to narrow it.
+        """
+        text = str(text).casefold()
+        if within is None:
+            within = range(len(self._keys))
+        start = bisect_left(self._segments, text, within.start, within.stop)
+        # No key contains the highest code point, so every key starting with `text` sorts before this one.
+        stop = bisect_left(self._segments, text + "\U0010ffff", start, within.stop)
+        return range(start, stop)
+
+    def range_names(self, positions: range, limit: int, predicate: Optional[Callable[[str], bool]] = None) -> List[str]:
+        """Return the first `limit` distinct names of the keys at `positions`, that `predicate` returns True for if given."""
+        names = []
+        for position in positions:
+            name = self.names[self._keys[position] >> _OFFSET_BITS]
+            if name not in names and (predicate is None or predicate(name)):
+                names.append(name)
+                if len(names) == limit:
+                    break
+        return names
+
+    def search(self, text: str, limit: int) -> List[str]:
+        """
+        Return up to `limit` names that start with `text`, or have a dotted segment that starts with it.
+        Names are ordered by the matched part of the name, so shorter completions of the same segment come first.
+        """
+        return self.range_names(self.key_range(text), limit)
+
+
+class AutocompleteCache:
+    """
+    Remembers the candidates of the last autocomplete queries, per user, so that the next query of a user
+    that extends their previous one only has to search the previous candidates.
+    Candidates are either a range of `AutocompleteIndex` key positions, or a list of names matched by `finder`.
+    Entries expire after `ttl` seconds, and the least recently used users are dropped past `maxsize`.
+    The cache must be cleared whenever the names it was filled from change.
+    """
+
+    def __init__(self, *, maxsize: int = 256, ttl: float = 30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[int, Tuple[str, float, Candidates]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, text: str) -> Optional[Candidates]:
+        """Return the candidates of the user's last query if `text` extends it, None otherwise."""
+        entry = self._entries.get(user_id)
+        if entry is None or time.monotonic() - entry[1] > self.ttl or not text.startswith(entry[0]):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[2]
+
+    def set(self, user_id: int, text: str, candidates: Candidates) -> None:
+        """Store `candidates` as the candidates of the user's query `text`."""
+        self._entries[user_id] = (text, time.monotonic(), candidates)
+        self._entries.move_to_end(user_id)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._entries.clear()
@@ -0,0 +1,116 @@
+import os
+import pickle
+import sys
+import zlib
+from array import array
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple, TYPE_CHECKING
+if TYPE_CHECKING:
+    from .registry import SymbolRegistry
+
+# Bumped whenever the layout below changes, snapshots of other versions are ignored.
+SNAPSHOT_VERSION = 2
+
+Validators = Dict[str, Tuple[Optional[str], Optional[str]]]
+
+
+class SnapshotRow(NamedTuple):
+    """The fields of a single stored symbol, `DocItem`s are rebuilt from these by the cog."""
+
+    symbol_name: str
+    package: str
+    group: str
+    relative_url_path: str
+    symbol_id: str
+    inventory_name: str
+
+
+class Snapshot(NamedTuple):
+    """A symbol registry restored from disk along with the validators of the inventories it was built from."""
+
+    base_urls: Dict[str, str]
+    validators: Validators
+    rows: Iterator[SnapshotRow]
+
+
+def dump_snapshot(path: str, base_urls: Dict[str, str], doc_symbols: 'SymbolRegistry', validators: Validators) -> None:
+    """
+    Write the symbol registry to `path`.
+    The symbols are stored in columns, with the package, group and page of every symbol
+    stored as indices into tables of their unique values.
+    The file is replaced atomically, so a crash while writing never leaves a truncated snapshot behind.
+    """
+    packages = {package: index for index, package in enumerate(base_urls)}
+    groups: Dict[str, int] = {}
+    pages: Dict[str, int] = {}
+
+    names = []
+    inventory_names = {}
+    symbol_ids = []
+    package_indices = array("H")
+    group_indices = array("H")
+    page_indices = array("I")
+    for symbol_name, doc_item in doc_symbols.items():
+        if doc_item.package not in packages:
+            continue
+        names.append(symbol_name)
+        if (inventory_name := doc_symbols.inventory_name(symbol_name)) != symbol_name:
+            inventory_names[symbol_name] = inventory_name
+        symbol_ids.append(doc_item.symbol_id)
+        package_indices.append(packages[doc_item.package])
+        group_indices.append(groups.setdefault(doc_item.group, len(groups)))
+        page_indices.append(pages.setdefault(doc_item.relative_url_path, len(pages)))
+
+    data = (
+        SNAPSHOT_VERSION,
+        base_urls,
+        validators,
+        list(groups),
+        list(pages),
+        names,
+        inventory_names,
+        symbol_ids,
+        package_indices.tobytes(),
+        group_indices.tobytes(),
+        page_indices.tobytes(),
+    )
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as file:
+        file.write(zlib.compress(pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL), 1))
+    os.replace(temp_path, path)
+
+
+def load_snapshot(path: str) -> Optional[Snapshot]:
+    """
+    Read the snapshot at `path`, return None if it doesn't exist or can't be used.
+    The rows are only read while they're iterated over, which may raise if the snapshot is malformed.
+    """
+    try:
+        with open(path, "rb") as file:
+            data = pickle.loads(zlib.decompress(file.read()))
+        if not isinstance(data, tuple) or not data or data[0] != SNAPSHOT_VERSION:
+            return None
+
+        _version, base_urls, validators, groups, pages, names, inventory_names, symbol_ids, *index_columns = data
+        package_indices, group_indices, page_indices = (
+            array(typecode, column) for typecode, column in zip("HHI", index_columns)
+        )
+        packages = list(base_urls)
+        groups = [sys.intern(group) for group in groups]
+        pages = [sys.intern(page) for page in pages]
+    except Exception:
+        # Whatever is wrong with the snapshot, the inventories can still be fetched instead.
+        return None
+
+    rows = (
+        SnapshotRow(
+            name,
+            packages[package_index],
+            groups[group_index],
+            pages[page_index],
+            symbol_id,
+            inventory_names.get(name, name),
+        )
+        for name, symbol_id, package_index, group_index, page_index
+        in zip(names, symbol_ids, package_indices, group_indices, page_indices)
+    )
+    return Snapshot(base_urls, validators, rows)
@@ -1,7 +1,10 @@
 import asyncio
 import contextlib
+import heapq
 import inspect
 import logging
+import random
+import time
 import typing as t
 from datetime import datetime
 from functools import partial
@@ -177,6 +180,60 @@ def _log_task_exception(task: asyncio.Task, *, suppressed_exceptions: t.Tuple[t.
             log.error(f"Error in task {task.get_name()} {id(task)}!", exc_info=exception)
 
 
+def backoff_delay(attempt: int, *, base: float, factor: float, maximum: float, jitter: float) -> float:
+    """
+    Return the delay to wait before retry number `attempt`, starting at 1.
+    The delay grows exponentially by `factor` from `base` up to `maximum`, then up to `jitter` of it
+    is added or removed at random so that the retries of many failing requests don't line up.
+    """
+    delay = min(base * factor ** (attempt - 1), maximum)
+    return delay * random.uniform(1 - jitter, 1 + jitter)
+
+
+def clean_symbol_name(symbol_name: str) -> str:
+    """
+    Return `symbol_name` without the decorations people tend to type around names,
+    surrounding whitespace and backticks and a trailing call, so `` `Embed()` `` becomes `Embed`.
+    """
+    symbol_name = symbol_name.strip().strip("`").strip()
+    if symbol_name.endswith(")") and (call_start := symbol_name.find("(")) > 0:
+        # The call may have been outside of the backticks, like `` `Embed`() ``.
+        symbol_name = symbol_name[:call_start].strip().strip("`").strip()
+    return symbol_name
+
+
+class CircuitBreaker:
+    """
+    Track consecutive failures of requests to a single host so that callers can fail fast while it's down.
+    After `threshold` consecutive failures the breaker opens and `is_open` is True for `cooldown` seconds.
+    Once the cooldown passes requests are let through again; a success closes the breaker,
+    while another failure opens it right away.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+
+        self._failures = 0
+        self._opened_at: t.Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        """Return True if requests to the host should fail without being attempted."""
+        return self._opened_at is not None and time.monotonic() - self._opened_at < self.cooldown
+
+    def record_success(self) -> None:
+        """Close the breaker and reset the count of consecutive failures."""
+        self._failures = 0
+        self._opened_at = None
+
+    def record_failure(self) -> None:
+        """Count a failed request, opening the breaker if `threshold` consecutive requests failed."""
+        self._failures += 1
+        if self._failures >= self.threshold:
+            self._opened_at = time.monotonic()
+
+
 class QuitButton(disnake.ui.View):
     def __init__(
         self,
@@ -216,23 +273,27 @@ class QuitButton(disnake.ui.View):
         self.stop()
 
 
-def finder(text, collection, *, key=None, lazy=True):
-    suggestions = []
+def finder(text, collection, *, key=None, lazy=True, k=None):
+    """
+    Return the items of `collection` that contain the characters of `text` in order, ignoring case.
+    Items are ordered by the length of their shortest match, then by where it starts, then by the item or its `key`.
+    If `k` is given, only the first `k` items are returned, kept in a bounded heap instead of sorting every match.
+    """
     text = str(text)
     pat = '.*?'.join(map(re.escape, text))
     regex = re.compile(pat, flags=re.IGNORECASE)
-    for item in collection:
-        to_search = key(item) if key else item
-        r = regex.search(to_search)
-        if r:
-            suggestions.append((len(r.group()), r.start(), item))
-
-    def sort_key(tup):
-        if key:
-            return tup[0], tup[1], key(tup[2])
-        return tup
+    if key:
+        # The key is computed once per item, and the index keeps items with equal keys in their original order.
+        suggestions = (
+            (len(r.group()), r.start(), to_search, index, item)
+            for index, item in enumerate(collection)
+            if (r := regex.search(to_search := key(item)))
+        )
+    else:
+        suggestions = ((len(r.group()), r.start(), item) for item in collection if (r := regex.search(item)))
 
+    ordered = heapq.nsmallest(k, suggestions) if k is not None else sorted(suggestions)
     if lazy:
-        return (z for _, _, z in sorted(suggestions, key=sort_key))
+        return (suggestion[-1] for suggestion in ordered)
     else:
-        return [z for _, _, z in sorted(suggestions, key=sort_key)]
+        return [suggestion[-1] for suggestion in ordered]
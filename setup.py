@@ -26,6 +26,9 @@ setup(
     packages=['docs'],
     include_package_data=True,
     install_requires=REQUIREMENTS,
+    extras_require={
+        'numpy': ['numpy']
+    },
     python_requires='>=3.8.0',
     classifiers=[
         'Development Status :: 5 - Production/Stable',